@@ -3,6 +3,7 @@ import pandas as pd
 from PIL import Image
 import plotly.express as px
 import numpy as np
+from data_loader import read_workbook
 
 # Set the maximum number of units for comparison
 MAX_UNITS = 10
@@ -11,7 +12,7 @@ MAX_UNITS = 10
 @st.cache_data
 def load_data():
     url = "Data_2025.xlsx"
-    return pd.read_excel(url, sheet_name="data", engine='openpyxl')
+    return read_workbook(url, sheet_name="data", compact_dtypes=False) # Parquet sidecar keyed by workbook mtime/size
 
 df = load_data()
 
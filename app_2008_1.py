@@ -3,6 +3,8 @@ import pandas as pd
 from PIL import Image
 import plotly.express as px
 import numpy as np
+from data_loader import read_workbook
+from static_images import image_source
 
 # Set the maximum number of units for comparison
 MAX_UNITS = 10
@@ -11,7 +13,7 @@ MAX_UNITS = 10
 @st.cache_data
 def load_data():
     url = "Data_2025.xlsx"
-    return pd.read_excel(url, sheet_name="data", engine='openpyxl')
+    return read_workbook(url, sheet_name="data", compact_dtypes=False) # Parquet sidecar keyed by workbook mtime/size
 
 df = load_data()
 
@@ -164,7 +166,7 @@ with main_container:
                         logo_path = str(df_item[logo_col_name].iloc[0])
                         if pd.notna(logo_path) and logo_path.strip():
                             try:
-                                st.image(f"images/{logo_path}", use_container_width=True)
+                                st.image(image_source(logo_path), use_container_width=True) # By URL when run through serve.py
                             except FileNotFoundError:
                                 st.warning(f"Brand logo image not found: images/{logo_path}")
                             except Exception as e:
@@ -186,7 +188,7 @@ with main_container:
                         photo_path = str(df_item[photo_col_name].iloc[0])
                         if pd.notna(photo_path) and photo_path.strip():
                             try:
-                                st.image(f"images/{photo_path}", use_container_width=True)
+                                st.image(image_source(photo_path), use_container_width=True) # By URL when run through serve.py
                             except FileNotFoundError:
                                 st.warning(f"Unit photo image not found: images/{photo_path}")
                             except Exception as e:
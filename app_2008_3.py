@@ -1,15 +1,17 @@
 import streamlit as st
 import pandas as pd
-from PIL import Image
 import plotly.express as px
 import numpy as np
+from comparison_table import comparison_matrix, matrix_row, parameters_differ, render_comparison_grid
+from data_loader import read_workbook
+from image_prep import prepare_images
 
 # -----------------------------
 # Load data
 # -----------------------------
 @st.cache_data
 def load_data():
-    return pd.read_excel("Data_2025.xlsx", sheet_name="data", engine="openpyxl")
+    return read_workbook("Data_2025.xlsx", sheet_name="data", compact_dtypes=False)
 
 df = load_data()
 
@@ -91,15 +93,20 @@ st.title("Technical Data Comparison")
 
 if all([not fu.empty for fu in filtered_units]):
 
+    # Logos and photos of every unit are loaded and resized in parallel (see image_prep), both strips
+    # at once; the results are drawn in column order
+    logo_paths = [str(fu[logo_col].iloc[0]) if logo_col in fu and pd.notna(fu[logo_col].iloc[0]) else None for fu in filtered_units]
+    photo_paths = [str(fu[unit_photo_col].iloc[0]) if unit_photo_col in fu and pd.notna(fu[unit_photo_col].iloc[0]) else None for fu in filtered_units]
+    logo_images = prepare_images(logo_paths, 150)
+    photo_images = prepare_images(photo_paths, 250)
+
     # --- Logos ---
     st.subheader("Brand Logos")
     cols = st.columns(n_units)
     for i, fu in enumerate(filtered_units):
-        logo_path = str(fu[logo_col].iloc[0]) if logo_col in fu and pd.notna(fu[logo_col].iloc[0]) else None
-        if logo_path:
+        if logo_images[i]:
             try:
-                img = Image.open(f"images/{logo_path}")
-                cols[i].image(img.resize((150, int(150 * img.height / img.width))), caption=f"{fu[brand_col].iloc[0]} Logo")
+                cols[i].image(logo_images[i].result(), caption=f"{fu[brand_col].iloc[0]} Logo")
             except:
                 cols[i].write("No logo")
         else:
@@ -109,24 +116,23 @@ if all([not fu.empty for fu in filtered_units]):
     st.subheader("Unit Photos")
     cols = st.columns(n_units)
     for i, fu in enumerate(filtered_units):
-        photo_path = str(fu[unit_photo_col].iloc[0]) if unit_photo_col in fu and pd.notna(fu[unit_photo_col].iloc[0]) else None
-        if photo_path:
+        if photo_images[i]:
             try:
-                img = Image.open(f"images/{photo_path}")
-                cols[i].image(img.resize((250, int(250 * img.height / img.width))), caption=f"{fu[unit_name_col].iloc[0]} Photo")
+                cols[i].image(photo_images[i].result(), caption=f"{fu[unit_name_col].iloc[0]} Photo")
             except:
                 cols[i].write("No photo")
         else:
             cols[i].write("No photo")
 
     # --- General Data Table ---
+    # One scrollable grid instead of a row of widgets per parameter and unit (up to 10 units)
     st.subheader("General Data")
-    for col_name in df.columns:
-        row_cols = st.columns([2] + [3]*n_units)
-        row_cols[0].markdown(f"**{col_name}**")
-        for i, fu in enumerate(filtered_units):
-            val = fu[col_name].iloc[0] if col_name in fu.columns and not fu.empty else "-"
-            row_cols[i+1].write(val)
+    comparison_values = comparison_matrix(filtered_units, df.columns)
+    # Diff-only view: only the parameters whose value is not the same for every unit
+    if st.checkbox("Show only differences", key="differences_only"):
+        render_comparison_grid(comparison_values[parameters_differ(comparison_values)], [f"Unit {i+1}" for i in range(n_units)])
+    else:
+        render_comparison_grid(comparison_values, [f"Unit {i+1}" for i in range(n_units)])
 
     # --- Example Chart (Unit size vs Region) ---
     if size_col and region_col:
@@ -150,10 +156,7 @@ if all([not fu.empty for fu in filtered_units]):
     csv_data.append(header_row)
 
     for col in df.columns:
-        row = [col]
-        for fu in filtered_units:
-            row.append(fu[col].iloc[0] if col in fu.columns and not fu.empty else "-")
-        csv_data.append(row)
+        csv_data.append([col] + matrix_row(comparison_values, col))
 
     csv_df = pd.DataFrame(csv_data)
     csv_string = csv_df.to_csv(index=False, header=False)
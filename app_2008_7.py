@@ -4,13 +4,15 @@ from PIL import Image
 import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
+from comparison_table import comparison_matrix, matrix_row
+from data_loader import read_workbook
 
 # Load data
 @st.cache_data
 def load_data():
     # Assuming Data_2025.xlsx is in the same directory as app.py
     url = "Data_2025.xlsx"
-    return pd.read_excel(url, sheet_name="data", engine='openpyxl')
+    return read_workbook(url, sheet_name="data", compact_dtypes=False) # Parquet sidecar keyed by workbook mtime/size
 
 df = load_data()
 
@@ -163,6 +165,9 @@ with st.sidebar:
             "recovery": selected_recovery, "type": selected_type, "material": selected_material
         })
 
+    # Parameter x unit values for the CSV export and the comparison table, built once per rerun
+    comparison_values = comparison_matrix(filtered_dfs, df.columns)
+
     # --- CSV Download Button ---
     st.markdown("---")
     csv_header = ["Parameter"] + [f"{s['brand']} - {s['unit']} - {s['size']}" for s in selections]
@@ -211,11 +216,7 @@ with st.sidebar:
             csv_displayed_headers.add(triggered_header)
 
         if col not in excluded_cols_from_table:
-            row = [col]
-            for i in range(num_units):
-                val = filtered_dfs[i][col].values[0] if not filtered_dfs[i].empty and col in filtered_dfs[i].columns else "-"
-                row.append(val)
-            csv_data.append(row)
+            csv_data.append([col] + matrix_row(comparison_values, col))
 
     csv_df = pd.DataFrame(csv_data)
     csv_string = csv_df.to_csv(index=False, header=False)
@@ -364,9 +365,10 @@ if not all(df.empty for df in filtered_dfs):
             row_cols = st.columns([2] + [3] * num_units)
             with row_cols[0]:
                 st.write(f'<span style="font-family: sans-serif; font-size: 16px;">{col}</span>', unsafe_allow_html=True)
+            values = matrix_row(comparison_values, col)
             for i in range(num_units):
                 with row_cols[i + 1]:
-                    val = filtered_dfs[i][col].values[0] if not filtered_dfs[i].empty and col in filtered_dfs[i].columns else "-"
+                    val = values[i]
                     color = colors[i % len(colors)]
                     st.markdown(f'<div style="text-align: center; font-family: sans-serif; font-size: 16px; color: {color};">{val}</div>', unsafe_allow_html=True)
 
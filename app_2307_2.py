@@ -4,13 +4,14 @@ from PIL import Image
 import plotly.express as px # Import plotly for charting
 import plotly.graph_objects as go # Import graph objects for more control if needed
 import numpy as np # For generating circle points
+from data_loader import read_workbook
 
 # Load data
 @st.cache_data
 def load_data():
     # Assuming Data_2025.xlsx is in the same directory as app.py
     url = "Data_2025.xlsx" # This path needs to be correct for your Streamlit environment
-    return pd.read_excel(url, sheet_name="data", engine='openpyxl')
+    return read_workbook(url, sheet_name="data", compact_dtypes=False) # Parquet sidecar keyed by workbook mtime/size
 
 df = load_data()
 
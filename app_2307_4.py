@@ -1,129 +1,102 @@
 import streamlit as st
 import pandas as pd
-from PIL import Image
-import plotly.express as px # Import plotly for charting
 import plotly.graph_objects as go # Import graph objects for more control if needed
-import numpy as np # For generating circle points
+from chart_traces import capacity_trace, comparison_figure, line_trace, unit_area_trace
+from comparison_cache import Comparison
+from comparison_table import ChartOutput, comparison_matrix, matrix_row, metric_comparison, parameters_differ, render_comparison_table, replay
+from data_store import DataStore, DataVersionChanged
+from selection_index import child_node, leaf_options, leaf_rows
+from static_images import image_url, static_serving
+from thumbnail_cache import ThumbnailCache
 
 # Load data
-@st.cache_data
-def load_data():
+@st.cache_resource
+def get_data_store():
     # Assuming Data_2025.xlsx is in the same directory as app.py
     url = "Data_2025.xlsx" # This path needs to be correct for your Streamlit environment
-    return pd.read_excel(url, sheet_name="data", engine='openpyxl')
-
-df = load_data()
-
-# Initialize chart display flags at the beginning of the script
-chart1_displayed = False
-chart2_displayed = False
-chart3_displayed = False
-electrical_heater_chart_displayed = False # Reinstated flag for electrical heater chart
-unit_area_chart_displayed = False # New flag for the new chart
-
-# Resolve potential column naming issues for robustness
-def get_column_safe(df, name_options):
-    for name in name_options:
-        if name in df.columns:
-            return name
-    return None
-
-unit_name_col = get_column_safe(df, ["Unit name", "Unit name", "Unit Name"])
-region_col = get_column_safe(df, ["Region"])
-year_col = get_column_safe(df, ["Year"])
-quarter_col = get_column_safe(df, ["Quarter"])
-recovery_col = get_column_safe(df, ["Recovery type", "Recovery Type", "Recovery_type"])
-size_col = get_column_safe(df, ["Unit size", "Unit Size"])
-brand_col = get_column_safe(df, ["Brand name", "Brand name", "Brand"])
-logo_col = get_column_safe(df, ["Brand logo", "Brand logo", "Brand Logo"])
-unit_photo_col = get_column_safe(df, ["Unit photo", "Unit photo", "Unit Photo", "Unit Photo Name"]) # Added common names for unit photo column
-unit_size_quantity_col = get_column_safe(df, ["Unit size quantity", "Unit Size quantity"]) # Explicitly define for relocation
-eurovent_model_box_col = get_column_safe(df, ["Eurovent Model Box"]) # New column
-
-# Specific columns to trigger chart or section header display
-internal_height_supply_filter_col = get_column_safe(df, ["Internal Height (Supply Filter) [mm]", "Internal Height (Supply Filter)", "Internal Height Supply Filter"])
-unit_cross_section_area_supply_fan_col = get_column_safe(df, ["Unit cross section area (Supply Fan) [m2]", "Unit cross section area (Supply Fan)", "Unit cross section area Supply Fan"])
-duct_connection_height_col = get_column_safe(df, ["Duct connection Height [mm]", "Duct connection Height", "Duct Connection Height"])
-# Column for circle diameter
-duct_connection_diameter_col = get_column_safe(df, ["Duct connection Diameter [mm]", "Duct connection Diameter", "Duct Connection Diameter"])
-
-# New columns for dropdowns and chart
-type_col = get_column_safe(df, ["Type"]) # This will be "Rotary wheel type"
-material_col = get_column_safe(df, ["Material"]) # This will be "PCR/HEX lamels material"
-capacity_range1_col = get_column_safe(df, ["Capacity range1 [kW]", "Capacity range1", "Capacity Range1"])
-capacity_range2_col = get_column_safe(df, ["Capacity range2 [kW]", "Capacity range2", "Capacity Range2"])
-capacity_range3_col = get_column_safe(df, ["Capacity range3 [kW]", "Capacity range3", "Capacity Range3"])
-heating_elements_type_col = get_column_safe(df, ["Heating elements type", "Heating Elements Type", "Heating_elements_type"])
-impeller_efficiency_col = get_column_safe(df, ["Impeller efficiency at nominal airflow [%]", "Impeller efficiency at nominal airflow"])
-
-# Updated column names based on user's latest input for efficiency
-sens_efficiency_nominal_rrg_col = get_column_safe(df, ["Sens. efficiency at nominal balanced airflows_RRG [%]", "Sens. efficiency at nominal balanced airflows [%]"])
-sens_efficiency_opt_rrg_col = get_column_safe(df, ["Sens. efficiency at opt balanced airflows (ErP)_RRG [%]", "Sens. efficiency at opt balanced airflows (ErP) [%]"])
-sens_efficiency_nominal_pcr_hex_col = get_column_safe(df, ["Sens. efficiency at nominal balanced airflows_PCR/HEX [%]", "Sens. efficiency at nominal balanced airflows [%].1"])
-sens_efficiency_opt_pcr_hex_col = get_column_safe(df, ["Sens. efficiency at opt balanced airflows (ErP)_PCR/HEX [%]", "Sens. efficiency at opt balanced airflows (ErP) [%].1"])
-
-metal_sheet_thickness_external_col = get_column_safe(df, ["Metal sheet thickness (External) [mm]", "Metal sheet thickness (External)"])
-air_speed_filter_max_airflow_col = get_column_safe(df, ["Air speed on Filter at opt airflow (ErP) [m/s]", "Air speed on Filter at opt airflow (ErP)"])
-final_pd_supply_col = get_column_safe(df, ["Final PD_Supply", "Final PD_typ1"]) # Updated name
-final_pd_exhaust_col = get_column_safe(df, ["Final PD_Exhaust", "Final PD_typ2"])
-
-# Columns for Duct Connection Width
-duct_connection_width_col = get_column_safe(df, ["Duct connection Width [mm]", "Duct connection Width"])
-water_heater_min_rows_col = get_column_safe(df, ["Water heater_min rows"]) # Added for Water heater header trigger
-water_cooler_min_rows_col = get_column_safe(df, ["Water cooler_min rows"])
-dxh_min_rows_col = get_column_safe(df, ["DXH_min rows"])
-filter_type_supply_col = get_column_safe(df, ["Filter type_Supply"])
-filter_type_exhaust_col = get_column_safe(df, ["Filter type_Exhaust"])
-silencer_casing_col = get_column_safe(df, ["Silencer casing"])
-motor_type_col = get_column_safe(df, ["Motor type"])
-supply_col = get_column_safe(df, ["Supply"])
-
-
-# Header trigger columns (mapping first column in a section to its header)
-header_triggers_map = {
-    get_column_safe(df, ["Eurovent Certificate"]): "Certification data",
-    supply_col: "Available configurations", # Changed trigger to 'Supply'
-    get_column_safe(df, ["Insulation material"]): "Casing", # Changed trigger to 'Insulation material'
-    get_column_safe(df, ["Minimum airflow [CMH]"]): "Airflows",
-    get_column_safe(df, ["Internal Width (Supply Filter) [mm]"]): "Overall dimensions", # Changed trigger to 'Internal Width (Supply Filter) [mm]'
-    type_col: "Rotary wheel",
-    sens_efficiency_nominal_pcr_hex_col: "PCR/HEX recovery exchanger",
-    motor_type_col: "Fan section data", # Changed trigger to 'Motor type'
-    heating_elements_type_col: "Electrical heater",
-    water_heater_min_rows_col: "Water heater", # Updated trigger for Water heater header
-    water_cooler_min_rows_col: "Water cooler", # Changed trigger to 'Water cooler_min rows'
-    dxh_min_rows_col: "DX/DXH cooler", # Changed trigger to 'DXH_min rows'
-    filter_type_supply_col: "Supply Filter", # Changed trigger to 'Filter type_Supply'
-    filter_type_exhaust_col: "Exhaust Filter", # Changed trigger to 'Filter type_Exhaust'
-    silencer_casing_col: "Silencer data" # Changed trigger to 'Silencer casing'
-}
-
-electrical_heater_chart_trigger_col = heating_elements_type_col # Still used to define chart insertion point
-
-
-# --- Chart 1 specific coordinate column names (X1-X5, Y1-Y5) ---
-coord_col_pairs_1_5 = []
-for i in range(1, 6):
-    x_col_name = get_column_safe(df, [f"x{i}", f"X{i}", f"X{i}_coord", f"x{i}_coord"])
-    y_col_name = get_column_safe(df, [f"y{i}", f"Y{i}", f"Y{i}_coord", f"y{i}_coord"])
-    if x_col_name and y_col_name:
-        coord_col_pairs_1_5.append((x_col_name, y_col_name))
-
-# --- Chart 2 specific coordinate column names (X6-X10, Y6-Y10) ---
-coord_col_pairs_6_10 = []
-for i in range(6, 11): # For X6, Y6 to X10, Y10
-    x_col_name = get_column_safe(df, [f"x{i}", f"X{i}", f"X{i}_coord", f"x{i}_coord"])
-    y_col_name = get_column_safe(df, [f"y{i}", f"Y{i}", f"Y{i}_coord", f"y{i}_coord"])
-    if x_col_name and y_col_name:
-        coord_col_pairs_6_10.append((x_col_name, y_col_name))
-
-# --- Chart 3 specific coordinate column names (X11-X15, Y11-Y15) ---
-coord_col_pairs_11_15 = []
-for i in range(11, 16): # For X11, Y11 to X15, Y15
-    x_col_name = get_column_safe(df, [f"x{i}", f"X{i}", f"X{i}_coord", f"x{i}_coord"])
-    y_col_name = get_column_safe(df, [f"y{i}", f"Y{i}", f"Y{i}_coord", f"y{i}_coord"])
-    if x_col_name and y_col_name:
-        coord_col_pairs_11_15.append((x_col_name, y_col_name))
+    # One store per server process; it watches the workbook and swaps in a fully rebuilt snapshot
+    # (frame, schema, selection index) when the file changes, so no restart or cache clear is needed
+    return DataStore(path=url, sheet_name="data").start()
+
+@st.cache_resource
+def get_thumbnail_cache():
+    # Resized logos and photos, shared by every session of this server process (see thumbnail_cache)
+    return ThumbnailCache()
+
+def show_image(name, size, height, caption):
+    # images/<name> (of pixel size `size`) at `height` pixels: by URL when the app runs through serve.py
+    # and the browser caches the file, otherwise as a thumbnail sent through the websocket
+    if static_serving():
+        st.image(image_url(name), width=int(size[0] * (height / size[1])), caption=caption)
+    else:
+        st.image(thumbnails.thumbnail(name, height), caption=caption)
+
+def load_artifact(name, year=None):
+    # snapshot.get(). If the workbook was re-saved since this run's snapshot was taken and the artifact
+    # isn't built yet, waits for the new data version and reruns the script on it (see data_store)
+    try:
+        return snapshot.get(name, year)
+    except DataVersionChanged:
+        if get_data_store().wait_for_reload(snapshot):
+            st.rerun()
+        st.info("The data file is being updated; the comparison is shown again once it has been reloaded.")
+        st.stop()
+
+# One data version for the whole script run. Artifacts are built on first use: the schema comes from
+# the header alone and the selection index from the cascade keys, so the sidebar doesn't wait for the
+# wide technical frame, which is only loaded once the widgets are drawn.
+snapshot = get_data_store().current()
+schema = load_artifact("schema")
+thumbnails = get_thumbnail_cache()
+
+# Column names resolved once per data version (see data_schema.COLUMN_ALIASES for the accepted aliases)
+unit_name_col = schema.unit_name_col
+region_col = schema.region_col
+year_col = schema.year_col
+quarter_col = schema.quarter_col
+recovery_col = schema.recovery_col
+size_col = schema.size_col
+brand_col = schema.brand_col
+logo_col = schema.logo_col
+unit_photo_col = schema.unit_photo_col
+unit_size_quantity_col = schema.unit_size_quantity_col
+eurovent_model_box_col = schema.eurovent_model_box_col
+internal_height_supply_filter_col = schema.internal_height_supply_filter_col
+unit_cross_section_area_supply_fan_col = schema.unit_cross_section_area_supply_fan_col
+duct_connection_height_col = schema.duct_connection_height_col
+duct_connection_diameter_col = schema.duct_connection_diameter_col
+type_col = schema.type_col
+material_col = schema.material_col
+capacity_range1_col = schema.capacity_range1_col
+capacity_range2_col = schema.capacity_range2_col
+capacity_range3_col = schema.capacity_range3_col
+heating_elements_type_col = schema.heating_elements_type_col
+impeller_efficiency_col = schema.impeller_efficiency_col
+sens_efficiency_nominal_rrg_col = schema.sens_efficiency_nominal_rrg_col
+sens_efficiency_opt_rrg_col = schema.sens_efficiency_opt_rrg_col
+sens_efficiency_nominal_pcr_hex_col = schema.sens_efficiency_nominal_pcr_hex_col
+sens_efficiency_opt_pcr_hex_col = schema.sens_efficiency_opt_pcr_hex_col
+metal_sheet_thickness_external_col = schema.metal_sheet_thickness_external_col
+air_speed_filter_max_airflow_col = schema.air_speed_filter_max_airflow_col
+final_pd_supply_col = schema.final_pd_supply_col
+final_pd_exhaust_col = schema.final_pd_exhaust_col
+duct_connection_width_col = schema.duct_connection_width_col
+water_heater_min_rows_col = schema.water_heater_min_rows_col
+water_cooler_min_rows_col = schema.water_cooler_min_rows_col
+dxh_min_rows_col = schema.dxh_min_rows_col
+filter_type_supply_col = schema.filter_type_supply_col
+filter_type_exhaust_col = schema.filter_type_exhaust_col
+silencer_casing_col = schema.silencer_casing_col
+motor_type_col = schema.motor_type_col
+supply_col = schema.supply_col
+electrical_heater_chart_trigger_col = schema.electrical_heater_chart_trigger_col
+header_triggers_map = schema.header_triggers_map # First column of each section -> section header
+coord_col_pairs_1_5 = schema.coord_col_pairs_1_5 # Chart 1 (X1-X5, Y1-Y5)
+coord_col_pairs_6_10 = schema.coord_col_pairs_6_10 # Chart 2 (X6-X10, Y6-Y10)
+coord_col_pairs_11_15 = schema.coord_col_pairs_11_15 # Chart 3 (X11-X15, Y11-Y15)
+
+# Selection index over the cascade keys, shared by all sessions
+selection_index = load_artifact("selection_index")
 
 
 # Main layout filters for the comparison interface
@@ -134,56 +107,55 @@ with st.sidebar:
     st.header("Select First Unit for Comparison") # Title for the sidebar filter section
 
     # Year filter
-    available_years1 = sorted(df[year_col].dropna().unique())
+    available_years1 = selection_index["options"]
     selected_year1 = st.selectbox("Year (Left)", available_years1, key="year1_sidebar") # Added _sidebar key
-    df_filtered_by_year1 = df[df[year_col] == selected_year1]
+    node1 = child_node(selection_index, selected_year1)
 
     # Quarter filter
-    available_quarters1 = sorted(df_filtered_by_year1[quarter_col].dropna().unique())
+    available_quarters1 = node1["options"]
     selected_quarter1 = st.selectbox("Quarter (Left)", available_quarters1, key="quarter1_sidebar")
-    df_filtered_by_quarter1 = df_filtered_by_year1[df_filtered_by_year1[quarter_col] == selected_quarter1]
+    node1 = child_node(node1, selected_quarter1)
 
     # Region filter
-    available_regions1 = sorted(df_filtered_by_quarter1[region_col].dropna().unique())
+    available_regions1 = node1["options"]
     selected_region1 = st.selectbox("Region (Left)", available_regions1, key="region1_sidebar")
-    df_filtered_by_region1 = df_filtered_by_quarter1[df_filtered_by_quarter1[region_col] == selected_region1]
+    node1 = child_node(node1, selected_region1)
 
     # Brand filter
-    available_brands1 = sorted(df_filtered_by_region1[brand_col].dropna().unique())
+    available_brands1 = node1["options"]
     selected_brand1 = st.selectbox("Select Brand (Left)", available_brands1, key="brand1_sidebar")
-    df_filtered_by_brand1 = df_filtered_by_region1[df_filtered_by_region1[brand_col] == selected_brand1]
+    node1 = child_node(node1, selected_brand1)
 
     # Unit name filter
-    available_units1 = sorted(df_filtered_by_brand1[unit_name_col].dropna().unique())
+    available_units1 = node1["options"]
     selected_unit1 = st.selectbox("Unit name (Left)", available_units1, key="unit1_sidebar")
-    df_filtered_by_unit1 = df_filtered_by_brand1[df_filtered_by_brand1[unit_name_col] == selected_unit1]
+    node1 = child_node(node1, selected_unit1)
 
     # Recovery type filter
-    available_recovery_types1 = sorted(df_filtered_by_unit1[recovery_col].dropna().unique())
+    available_recovery_types1 = node1["options"]
     selected_recovery1 = st.selectbox("Recovery type (Left)", available_recovery_types1, key="recovery1_sidebar")
-    df_filtered_by_recovery1 = df_filtered_by_unit1[df_filtered_by_unit1[recovery_col] == selected_recovery1]
+    node1 = child_node(node1, selected_recovery1)
+    recovery_node1 = node1 # All sizes of the selected unit/recovery type, used by the unit area chart
 
     # Unit size filter
-    available_sizes1 = sorted(df_filtered_by_recovery1[size_col].dropna().unique())
+    available_sizes1 = node1["options"]
     selected_size1 = st.selectbox("Unit size (Left)", available_sizes1, key="size1_sidebar")
-    df_filtered_by_size1 = df_filtered_by_recovery1[df_filtered_by_recovery1[size_col] == selected_size1]
+    node1 = child_node(node1, selected_size1)
 
     # Conditional dropdowns based on Recovery type
     selected_type1 = None
     selected_material1 = None
-    df_temp_filtered_by_type1 = df_filtered_by_size1 # Temporary dataframe for subsequent filtering
+    rows1 = node1["rows"] # Row labels of the final selection, taken from the wide frame below
 
     if selected_recovery1 == "RRG" and type_col:
-        available_types1 = sorted(df_filtered_by_size1[type_col].dropna().unique())
+        available_types1 = leaf_options(node1, type_col)
         selected_type1 = st.selectbox("Rotary wheel type (Left)", available_types1, key="type1_sidebar")
-        df_temp_filtered_by_type1 = df_filtered_by_size1[df_filtered_by_size1[type_col] == selected_type1]
+        rows1 = leaf_rows(node1, type_col, selected_type1)
     elif selected_recovery1 in ["HEX", "PCR"] and material_col:
-        available_materials1 = sorted(df_filtered_by_size1[material_col].dropna().unique())
+        available_materials1 = leaf_options(node1, material_col)
         selected_material1 = st.selectbox("PCR/HEX lamels material (Left)", available_materials1, key="material1_sidebar")
-        df_temp_filtered_by_type1 = df_filtered_by_size1[df_filtered_by_size1[material_col] == selected_material1]
+        rows1 = leaf_rows(node1, material_col, selected_material1)
     
-    # This is the final filtered DataFrame for the left column
-    filtered_df1 = df_temp_filtered_by_type1
 
     st.markdown("---") # Separator for the second set of filters in sidebar
 
@@ -191,207 +163,166 @@ with st.sidebar:
     st.header("Select Second Unit for Comparison")
 
     # Year filter
-    available_years2 = sorted(df[year_col].dropna().unique())
+    available_years2 = selection_index["options"]
     selected_year2 = st.selectbox("Year (Right)", available_years2, key="year2_sidebar")
-    df_filtered_by_year2 = df[df[year_col] == selected_year2]
+    node2 = child_node(selection_index, selected_year2)
 
     # Quarter filter
-    available_quarters2 = sorted(df_filtered_by_year2[quarter_col].dropna().unique())
+    available_quarters2 = node2["options"]
     selected_quarter2 = st.selectbox("Quarter (Right)", available_quarters2, key="quarter2_sidebar")
-    df_filtered_by_quarter2 = df_filtered_by_year2[df_filtered_by_year2[quarter_col] == selected_quarter2]
+    node2 = child_node(node2, selected_quarter2)
 
     # Region filter
-    available_regions2 = sorted(df_filtered_by_quarter2[region_col].dropna().unique())
+    available_regions2 = node2["options"]
     selected_region2 = st.selectbox("Region (Right)", available_regions2, key="region2_sidebar")
-    df_filtered_by_region2 = df_filtered_by_quarter2[df_filtered_by_quarter2[region_col] == selected_region2]
+    node2 = child_node(node2, selected_region2)
 
     # Brand filter
-    available_brands2 = sorted(df_filtered_by_region2[brand_col].dropna().unique())
+    available_brands2 = node2["options"]
     selected_brand2 = st.selectbox("Select Brand (Right)", available_brands2, key="brand2_sidebar")
-    df_filtered_by_brand2 = df_filtered_by_region2[df_filtered_by_region2[brand_col] == selected_brand2]
+    node2 = child_node(node2, selected_brand2)
 
     # Unit name filter
-    available_units2 = sorted(df_filtered_by_brand2[unit_name_col].dropna().unique())
+    available_units2 = node2["options"]
     selected_unit2 = st.selectbox("Unit name (Right)", available_units2, key="unit2_sidebar")
-    df_filtered_by_unit2 = df_filtered_by_brand2[df_filtered_by_brand2[unit_name_col] == selected_unit2]
+    node2 = child_node(node2, selected_unit2)
 
     # Recovery type filter
-    available_recovery_types2 = sorted(df_filtered_by_unit2[recovery_col].dropna().unique())
+    available_recovery_types2 = node2["options"]
     selected_recovery2 = st.selectbox("Recovery type (Right)", available_recovery_types2, key="recovery2_sidebar")
-    df_filtered_by_recovery2 = df_filtered_by_unit2[df_filtered_by_unit2[recovery_col] == selected_recovery2]
+    node2 = child_node(node2, selected_recovery2)
+    recovery_node2 = node2 # All sizes of the selected unit/recovery type, used by the unit area chart
 
     # Unit size filter
-    available_sizes2 = sorted(df_filtered_by_recovery2[size_col].dropna().unique())
+    available_sizes2 = node2["options"]
     selected_size2 = st.selectbox("Unit size (Right)", available_sizes2, key="size2_sidebar")
-    df_filtered_by_size2 = df_filtered_by_recovery2[df_filtered_by_recovery2[size_col] == selected_size2]
+    node2 = child_node(node2, selected_size2)
 
     # Conditional dropdowns based on Recovery type
     selected_type2 = None
     selected_material2 = None
-    df_temp_filtered_by_type2 = df_filtered_by_size2 # Temporary dataframe for subsequent filtering
+    rows2 = node2["rows"] # Row labels of the final selection, taken from the wide frame below
 
     if selected_recovery2 == "RRG" and type_col:
-        available_types2 = sorted(df_filtered_by_size2[type_col].dropna().unique())
+        available_types2 = leaf_options(node2, type_col)
         selected_type2 = st.selectbox("Rotary wheel type (Right)", available_types2, key="type2_sidebar")
-        df_temp_filtered_by_type2 = df_filtered_by_size2[df_filtered_by_size2[type_col] == selected_type2]
+        rows2 = leaf_rows(node2, type_col, selected_type2)
     elif selected_recovery2 in ["HEX", "PCR"] and material_col:
-        available_materials2 = sorted(df_filtered_by_size2[material_col].dropna().unique())
+        available_materials2 = leaf_options(node2, material_col)
         selected_material2 = st.selectbox("PCR/HEX lamels material (Right)", available_materials2, key="material2_sidebar")
-        df_temp_filtered_by_type2 = df_filtered_by_size2[df_filtered_by_size2[material_col] == selected_material2]
+        rows2 = leaf_rows(node2, material_col, selected_material2)
     
-    # This is the final filtered DataFrame for the right column
-    filtered_df2 = df_temp_filtered_by_type2
 
-    st.markdown("---") # Separator for the second set of filters in sidebar
+    # Both selection blocks are drawn; now load the wide technical frame of each selected year (years
+    # nobody selects are never loaded) and pick the selected rows from it
+    df1 = load_artifact("df", selected_year1)
+    df2 = load_artifact("df", selected_year2)
+    filtered_df1 = df1.loc[rows1]
+    filtered_df2 = df2.loc[rows2]
+    # Chart fragments of the selected rows, built once per data version and row (see chart_traces)
+    traces1 = load_artifact("chart_traces", selected_year1).unit(rows1)
+    traces2 = load_artifact("chart_traces", selected_year2).unit(rows2)
+    # Matrix, metrics, layout plan, CSV and charts depend only on the final selections, so they are
+    # cached per selection pair and re-used when the user switches back to it (see comparison_cache)
+    selection_key = (
+        (selected_year1, selected_quarter1, selected_region1, selected_brand1, selected_unit1, selected_recovery1, selected_size1, selected_type1, selected_material1),
+        (selected_year2, selected_quarter2, selected_region2, selected_brand2, selected_unit2, selected_recovery2, selected_size2, selected_type2, selected_material2),
+    )
 
-    # --- CSV Download Button in Sidebar ---
-    # Prepare data for CSV download
-    csv_data = []
-    # Add headers for CSV
-    csv_data.append(["Parameter", f"{selected_brand1} - {selected_unit1} - {selected_size1}", f"{selected_brand2} - {selected_unit2} - {selected_size2}"])
-
-    # List of columns to be excluded from the comparison table display directly as text
-    raw_excluded_cols_base = [
-        brand_col, logo_col, unit_photo_col, year_col, quarter_col, region_col,
-        unit_name_col, recovery_col, size_col, # Exclude dropdowns themselves
-        type_col, material_col # Exclude type/material as they are dropdown values
-    ]
-    # Add all resolved coordinate column names (used only for charts)
-    for x_name, y_name in coord_col_pairs_1_5 + coord_col_pairs_6_10 + coord_col_pairs_11_15:
-        if x_name: raw_excluded_cols_base.append(x_name)
-        if y_name: raw_excluded_cols_base.append(y_name)
-
-    # Unit area column for the new chart should also be excluded from the main table
-    unit_area_col_name = get_column_safe(df, ["Unit cross section area (Supply Filter) [m2]"])
-    if unit_area_col_name: raw_excluded_cols_base.append(unit_area_col_name)
-
-    # Exclude capacity range columns from table display, they will only be in the chart
-    # REMOVED from here to allow them to be displayed as lines in the table
-    # if capacity_range1_col: raw_excluded_cols_base.append(capacity_range1_col)
-    # if capacity_range2_col: raw_excluded_cols_base.append(capacity_range2_col)
-    # if capacity_range3_col: raw_excluded_cols_base.append(capacity_range3_col)
-
-
-    # Filter out any None values and ensure uniqueness
-    excluded_cols_from_table = list(set([col_name for col_name in raw_excluded_cols_base if col_name is not None]))
-    
-    # Set of headers to be conditionally excluded from display
-    excluded_headers_from_display = set()
-
-    # Conditional Hiding Logic for columns and headers based on selected Recovery types
-    # Rotary wheel related columns and header if both HEX
-    if selected_recovery1 == "HEX" and selected_recovery2 == "HEX":
-        if get_column_safe(df, ["Wheel diameter [mm]"]): excluded_cols_from_table.append(get_column_safe(df, ["Wheel diameter [mm]"]))
-        if get_column_safe(df, ["Distance between lamels [mm]"]): excluded_cols_from_table.append(get_column_safe(df, ["Distance between lamels [mm]"]))
-        if type_col: excluded_cols_from_table.append(type_col) # Type column is for Rotary wheel
-        excluded_headers_from_display.add("Rotary wheel")
-        # Also hide RRG efficiencies if both are HEX
-        if sens_efficiency_nominal_rrg_col: excluded_cols_from_table.append(sens_efficiency_nominal_rrg_col)
-        if sens_efficiency_opt_rrg_col: excluded_cols_from_table.append(sens_efficiency_opt_rrg_col)
-
-
-    # PCR/HEX related columns and header if both RRG
-    if selected_recovery1 == "RRG" and selected_recovery2 == "RRG":
-        if material_col: excluded_cols_from_table.append(material_col) # Material column is for PCR/HEX
-        if sens_efficiency_nominal_pcr_hex_col: excluded_cols_from_table.append(sens_efficiency_nominal_pcr_hex_col)
-        if sens_efficiency_opt_pcr_hex_col: excluded_cols_from_table.append(sens_efficiency_opt_pcr_hex_col)
-        excluded_headers_from_display.add("PCR/HEX recovery exchanger")
-
-    # Ensure uniqueness after conditional additions
-    excluded_cols_from_table = list(set(excluded_cols_from_table))
-
-    # Collect all comparison data for CSV, respecting conditional exclusions
-    csv_displayed_headers = set()
-    csv_data.append(["General data", "", ""]) # Initial header for CSV
-
-    # Build CSV data based on the full column order, applying exclusions
-    for col in df.columns:
-        # Check if this column triggers a section header for CSV
-        triggered_header_csv = None
-        for trigger_col, header_title in header_triggers_map.items():
-            if trigger_col == col and header_title not in csv_displayed_headers and header_title not in excluded_headers_from_display:
-                triggered_header_csv = header_title
-                csv_displayed_headers.add(header_title)
-                break
-
-        if triggered_header_csv:
-            csv_data.append(["", "", ""]) # Blank line before new section
-            csv_data.append([triggered_header_csv, "", ""]) # Add new section header
-
-        # Add the parameter row to CSV data if not excluded
-        if col not in excluded_cols_from_table:
-            val1 = filtered_df1[col].values[0] if col in filtered_df1.columns else "-"
-            val2 = filtered_df2[col].values[0] if col in filtered_df2.columns else "-"
-            csv_data.append([col, val1, val2])
-
-
-    csv_df = pd.DataFrame(csv_data)
-    csv_string = csv_df.to_csv(index=False, header=False) # No header because we manually added it
+    def build_comparison():
+        # Parameter x unit values for the CSV export and the comparison table
+        comparison_values = comparison_matrix([filtered_df1, filtered_df2], schema.columns)
+        # Delta against the first unit and rank among the units for the numeric spec rows (see data_schema.METRIC_FIELDS)
+        comparison_metrics = metric_comparison(comparison_values, schema.metric_cols)
+
+        # --- CSV Download Button in Sidebar ---
+        # Prepare data for CSV download
+        csv_data = []
+        # Add headers for CSV
+        csv_data.append(["Parameter", f"{selected_brand1} - {selected_unit1} - {selected_size1}", f"{selected_brand2} - {selected_unit2} - {selected_size2}"])
+
+        # Rows, section headers and charts to show for this recovery-type combination, built once per
+        # combination and data version (see display_layout)
+        layout_plan = load_artifact("layout_plans").get([selected_recovery1, selected_recovery2])
+
+        # Collect all comparison data for CSV, respecting conditional exclusions
+        csv_data.append(["General data", "", ""]) # Initial header for CSV
+        for kind, value in layout_plan.csv_items:
+            if kind == "header":
+                csv_data.append(["", "", ""]) # Blank line before new section
+                csv_data.append([value, "", ""]) # Add new section header
+            else:
+                csv_data.append([value] + matrix_row(comparison_values, value))
+
+        csv_df = pd.DataFrame(csv_data)
+        csv_string = csv_df.to_csv(index=False, header=False) # No header because we manually added it
+        return Comparison(comparison_values, comparison_metrics, layout_plan, csv_string)
+
+    comparison = load_artifact("comparison_cache").get(selection_key, build_comparison)
+    comparison_values = comparison.matrix
+    comparison_metrics = comparison.metrics
+    layout_plan = comparison.layout_plan
+
+    st.markdown("---") # Separator for the second set of filters in sidebar
 
     st.download_button(
         label="Download Comparison as CSV",
-        data=csv_string,
+        data=comparison.csv_string,
         file_name="technical_data_comparison.csv",
         mime="text/csv",
         key="csv_download_sidebar" # Unique key for sidebar button
     )
 
+    # Diff-only view: parameters with the same value for every unit are hidden from the table, on top of
+    # the layout plan's excluded columns (the CSV keeps every row)
+    show_differences_only = st.checkbox("Show only differences", key="differences_only_sidebar")
+    hidden_cols = set(comparison_values.index[~parameters_differ(comparison_values)]) if show_differences_only else set()
+
 
 # --- Main Content Area ---
 
 # --- Image Height Synchronization (Brand Logos) ---
+# Both images of a pair are shown at the taller one's height. The sizes come from the image index built
+# from the file headers at startup (see image_index); the images from the thumbnail cache, or by URL
+# when served statically (see show_image).
 st.subheader("Brand Logos")
 col_logo1, col_logo2 = st.columns(2)
 
-loaded_image1 = None
+logo_size1 = None
 brand1_logo_path_raw = filtered_df1[logo_col].iloc[0] if not filtered_df1.empty and logo_col and logo_col in filtered_df1.columns else None
 brand1_logo_path = str(brand1_logo_path_raw) if pd.notna(brand1_logo_path_raw) else None
 
 if isinstance(brand1_logo_path, str) and brand1_logo_path.strip():
     try:
-        loaded_image1 = Image.open(f"images/{brand1_logo_path}")
+        logo_size1 = thumbnails.size(brand1_logo_path)
     except FileNotFoundError:
         st.warning(f"Brand logo image not found for {selected_brand1}: images/{brand1_logo_path}")
     except Exception as e:
         st.warning(f"Error loading brand logo for {selected_brand1}: {e}")
 
-loaded_image2 = None
+logo_size2 = None
 brand2_logo_path_raw = filtered_df2[logo_col].iloc[0] if not filtered_df2.empty and logo_col and logo_col in filtered_df2.columns else None
 brand2_logo_path = str(brand2_logo_path_raw) if pd.notna(brand2_logo_path_raw) else None
 
 if isinstance(brand2_logo_path, str) and brand2_logo_path.strip():
     try:
-        loaded_image2 = Image.open(f"images/{brand2_logo_path}")
+        logo_size2 = thumbnails.size(brand2_logo_path)
     except FileNotFoundError:
         st.warning(f"Brand logo image not found for {selected_brand2}: images/{brand2_logo_path}")
     except Exception as e:
         st.warning(f"Error loading brand logo for {selected_brand2}: {e}")
 
-max_logo_height = 0
-if loaded_image1:
-    max_logo_height = max(max_logo_height, loaded_image1.height)
-if loaded_image2:
-    max_logo_height = max(max_logo_height, loaded_image2.height)
+max_logo_height = max([size[1] for size in (logo_size1, logo_size2) if size], default=0)
 
 with col_logo1:
-    if loaded_image1:
-        width1 = 150
-        height1 = int(loaded_image1.height * (width1 / loaded_image1.width))
-        if max_logo_height > 0:
-            width1 = int(loaded_image1.width * (max_logo_height / loaded_image1.height))
-            height1 = max_logo_height
-        st.image(loaded_image1.resize((width1, height1)), caption=f"Logo for {selected_brand1}")
+    if logo_size1:
+        show_image(brand1_logo_path, logo_size1, max_logo_height, f"Logo for {selected_brand1}")
     else:
         st.write("No logo available for selected brand.")
 
 with col_logo2:
-    if loaded_image2:
-        width2 = 150
-        height2 = int(loaded_image2.height * (width2 / loaded_image2.width))
-        if max_logo_height > 0:
-            width2 = int(loaded_image2.width * (max_logo_height / loaded_image2.height))
-            height2 = max_logo_height
-        st.image(loaded_image2.resize((width2, height2)), caption=f"Logo for {selected_brand2}")
+    if logo_size2:
+        show_image(brand2_logo_path, logo_size2, max_logo_height, f"Logo for {selected_brand2}")
     else:
         st.write("No logo available for selected brand.")
 
@@ -400,55 +331,41 @@ with col_logo2:
 st.subheader("Unit Photo")
 col_photo1, col_photo2 = st.columns(2)
 
-loaded_unit_image1 = None
+unit_photo_size1 = None
 unit_photo_path1_raw = filtered_df1[unit_photo_col].values[0] if not filtered_df1.empty and unit_photo_col and unit_photo_col in filtered_df1.columns else None
 unit_photo_path1 = str(unit_photo_path1_raw) if pd.notna(unit_photo_path1_raw) else None
 
 if isinstance(unit_photo_path1, str) and unit_photo_path1.strip():
     try:
-        loaded_unit_image1 = Image.open(f"images/{unit_photo_path1}")
+        unit_photo_size1 = thumbnails.size(unit_photo_path1)
     except FileNotFoundError:
         st.warning(f"Unit photo image not found for {selected_unit1}: images/{unit_photo_path1}")
     except Exception as e:
         st.warning(f"Error loading unit photo for {selected_unit1}: {e}")
 
-loaded_unit_image2 = None
+unit_photo_size2 = None
 unit_photo_path2_raw = filtered_df2[unit_photo_col].values[0] if not filtered_df2.empty and unit_photo_col and unit_photo_col in filtered_df2.columns else None
 unit_photo_path2 = str(unit_photo_path2_raw) if pd.notna(unit_photo_path2_raw) else None
 
 if isinstance(unit_photo_path2, str) and unit_photo_path2.strip():
     try:
-        loaded_unit_image2 = Image.open(f"images/{unit_photo_path2}")
+        unit_photo_size2 = thumbnails.size(unit_photo_path2)
     except FileNotFoundError:
         st.warning(f"Unit photo image not found for {selected_unit2}: images/{unit_photo_path2}")
     except Exception as e:
         st.warning(f"Error loading unit photo for {selected_unit2}: {e}")
 
-max_unit_photo_height = 0
-if loaded_unit_image1:
-    max_unit_photo_height = max(max_unit_photo_height, loaded_unit_image1.height)
-if loaded_unit_image2:
-    max_unit_photo_height = max(max_unit_photo_height, loaded_unit_image2.height)
+max_unit_photo_height = max([size[1] for size in (unit_photo_size1, unit_photo_size2) if size], default=0)
 
 with col_photo1:
-    if loaded_unit_image1:
-        width1 = 250
-        height1 = int(loaded_unit_image1.height * (width1 / loaded_unit_image1.width))
-        if max_unit_photo_height > 0:
-            width1 = int(loaded_unit_image1.width * (max_unit_photo_height / loaded_unit_image1.height))
-            height1 = max_unit_photo_height
-        st.image(loaded_unit_image1.resize((width1, height1)), caption=f"{selected_unit1} Photo")
+    if unit_photo_size1:
+        show_image(unit_photo_path1, unit_photo_size1, max_unit_photo_height, f"{selected_unit1} Photo")
     else:
         st.write("No unit photo available for this selection.")
 
 with col_photo2:
-    if loaded_unit_image2:
-        width2 = 250
-        height2 = int(loaded_unit_image2.height * (width2 / loaded_unit_image2.width))
-        if max_unit_photo_height > 0:
-            width2 = int(loaded_unit_image2.width * (max_unit_photo_height / loaded_unit_image2.height))
-            height2 = max_unit_photo_height
-        st.image(loaded_unit_image2.resize((width2, height2)), caption=f"{selected_unit2} Photo")
+    if unit_photo_size2:
+        show_image(unit_photo_path2, unit_photo_size2, max_unit_photo_height, f"{selected_unit2} Photo")
     else:
         st.write("No unit photo available for this selection.")
 
@@ -456,506 +373,222 @@ with col_photo2:
 if not filtered_df1.empty and not filtered_df2.empty:
     st.subheader("General data")
 
-    # Initial table header for Streamlit display
-    col1, col2, col3 = st.columns([2, 3, 3])
-    with col1:
-        st.markdown("**Parameter**")
-    with col2:
-        st.markdown(f'<div style="text-align: center;">**{selected_brand1} - {selected_unit1} - {selected_size1}**</div>', unsafe_allow_html=True)
-    with col3:
-        st.markdown(f'<div style="text-align: center;">**{selected_brand2} - {selected_unit2} - {selected_size2}**</div>', unsafe_allow_html=True)
-
-    displayed_headers = set()
-
-    # Build a list of items to display in order
-    display_items_ordered = []
-
-    # Iterate through df.columns to build the ordered list of display items
-    for col_name in df.columns:
-        # Special handling for 'Unit size quantity' and its chart
-        if col_name == get_column_safe(df, ["Execution"]):
-            # Add 'Unit size quantity' after 'Execution'
-            if unit_size_quantity_col not in excluded_cols_from_table:
-                display_items_ordered.append({"type": "row", "col": unit_size_quantity_col})
-            # Add the chart right after 'Unit size quantity'
-            display_items_ordered.append({"type": "chart", "name": "unit_area_chart"})
-            # Skip adding 'Unit size quantity' later if it was already added here
-            continue # Continue to next column in df.columns
-
-        # Check if this column starts a new header section
-        # This logic ensures headers are placed *before* their associated data rows
-        if col_name in header_triggers_map and header_triggers_map[col_name] not in displayed_headers and header_triggers_map[col_name] not in excluded_headers_from_display:
-            display_items_ordered.append({"type": "header", "title": header_triggers_map[col_name]})
-            displayed_headers.add(header_triggers_map[col_name])
-
-        # Add the column's row if it's not excluded and not already handled (like unit_size_quantity_col)
-        if col_name not in excluded_cols_from_table and col_name != unit_size_quantity_col:
-            display_items_ordered.append({"type": "row", "col": col_name})
-
-        # Insert charts after their respective trigger columns
-        if col_name == internal_height_supply_filter_col:
-            display_items_ordered.append({"type": "chart", "name": "chart1"})
-        elif col_name == unit_cross_section_area_supply_fan_col:
-            display_items_ordered.append({"type": "chart", "name": "chart2"})
-        elif col_name == duct_connection_height_col:
-            display_items_ordered.append({"type": "chart", "name": "chart3"})
-        elif col_name == electrical_heater_chart_trigger_col:
-            # Insert the capacity range lines BEFORE the electrical heater chart
-            if capacity_range1_col:
-                display_items_ordered.append({"type": "row", "col": capacity_range1_col})
-            if capacity_range2_col:
-                display_items_ordered.append({"type": "row", "col": capacity_range2_col})
-            if capacity_range3_col:
-                display_items_ordered.append({"type": "row", "col": capacity_range3_col})
-            display_items_ordered.append({"type": "chart", "name": "electrical_heater_chart"})
-
-
-    # Now iterate through the ordered display_items_ordered list
-    for item in display_items_ordered:
-        if item["type"] == "header":
-            header_col1, header_col2, header_col3 = st.columns([1, 4, 1])
-            with header_col2:
-                st.markdown(f'<h4 style="text-align: center; font-size: 1.2em; margin-bottom: 0.5em; margin-top: 0.5em;">{item["title"]}</h4>', unsafe_allow_html=True)
-            
-            # Re-add table headers for the new section
-            col1, col2, col3 = st.columns([2, 3, 3])
-            with col1: st.markdown("**Parameter**")
-            with col2:
-                st.markdown(f'<div style="text-align: center;">**{selected_brand1} - {selected_unit1} - {selected_size1}**</div>', unsafe_allow_html=True)
-            with col3:
-                st.markdown(f'<div style="text-align: center;">**{selected_brand2} - {selected_unit2} - {selected_size2}**</div>', unsafe_allow_html=True)
-
-        elif item["type"] == "row":
-            col = item["col"]
-            val1 = filtered_df1[col].values[0] if col in filtered_df1.columns else "-"
-            val2 = filtered_df2[col].values[0] if col in filtered_df2.columns else "-"
-            
-            row_col1, row_col2, row_col3 = st.columns([2, 3, 3])
-            with row_col1:
-                st.write(f'<span style="font-family: sans-serif; font-size: 16px;">{col}</span>', unsafe_allow_html=True)
-            with row_col2:
-                st.markdown(f'<div style="text-align: center; font-family: sans-serif; font-size: 16px; color: green;">{val1}</div>', unsafe_allow_html=True)
-            with row_col3:
-                st.markdown(f'<div style="text-align: center; font-family: sans-serif; font-size: 16px; color: blue;">{val2}</div>', unsafe_allow_html=True)
-
-        elif item["type"] == "chart":
-            chart_name = item["name"]
-            if chart_name == "unit_area_chart" and not unit_area_chart_displayed:
-                if unit_area_col_name and unit_area_col_name in df.columns and size_col in df.columns:
-                    chart_data_area = []
-
-                    df_chart_base1 = df[
-                        (df[year_col] == selected_year1) & (df[quarter_col] == selected_quarter1) &
-                        (df[region_col] == selected_region1) & (df[brand_col] == selected_brand1) &
-                        (df[unit_name_col] == selected_unit1) & (df[recovery_col] == selected_recovery1)
-                    ].copy()
-                    if selected_recovery1 == "RRG" and type_col and selected_type1:
-                        df_chart_base1 = df_chart_base1[df_chart_base1[type_col] == selected_type1]
-                    elif selected_recovery1 in ["HEX", "PCR"] and material_col and selected_material1:
-                        df_chart_base1 = df_chart_base1[df_chart_base1[material_col] == selected_material1]
-
-                    df_chart_base2 = df[
-                        (df[year_col] == selected_year2) & (df[quarter_col] == selected_quarter2) &
-                        (df[region_col] == selected_region2) & (df[brand_col] == selected_brand2) &
-                        (df[unit_name_col] == selected_unit2) & (df[recovery_col] == selected_recovery2)
-                    ].copy()
-                    if selected_recovery2 == "RRG" and type_col and selected_type2:
-                        df_chart_base2 = df_chart_base2[df_chart_base2[type_col] == selected_type2]
-                    elif selected_recovery2 in ["HEX", "PCR"] and material_col and selected_material2:
-                        df_chart_base2 = df_chart_base2[df_chart_base2[material_col] == selected_material2]
-
-                    if not df_chart_base1.empty and unit_area_col_name in df_chart_base1.columns and size_col in df_chart_base1.columns:
-                        for index, row in df_chart_base1.iterrows():
-                            if pd.notna(row[unit_area_col_name]) and pd.notna(row[size_col]):
-                                chart_data_area.append({
-                                    "Brand_UnitSize": f"{selected_brand1} - Size {row[size_col]}", # Combined for Y-axis
-                                    "Unit Cross Section Area (m²)": row[unit_area_col_name],
-                                    "Unit Size": row[size_col], # For text label and hover
-                                    "Selection_Label": f"Left: {selected_brand1}",
-                                    "Full_Selection_Details": f"Left: {selected_year1}-{selected_quarter1}-{selected_brand1}-{row[unit_name_col]}-{row[size_col]}"
-                                })
-
-                    if not df_chart_base2.empty and unit_area_col_name in df_chart_base2.columns and size_col in df_chart_base2.columns:
-                        for index, row in df_chart_base2.iterrows():
-                            if pd.notna(row[unit_area_col_name]) and pd.notna(row[size_col]):
-                                chart_data_area.append({
-                                    "Brand_UnitSize": f"{selected_brand2} - Size {row[size_col]}", # Combined for Y-axis
-                                    "Unit Cross Section Area (m²)": row[unit_area_col_name],
-                                    "Unit Size": row[size_col], # For text label and hover
-                                    "Selection_Label": f"Right: {selected_brand2}",
-                                    "Full_Selection_Details": f"Right: {selected_year2}-{selected_quarter2}-{selected_brand2}-{row[unit_name_col]}-{row[size_col]}"
-                                })
-
-                if chart_data_area:
-                    chart_df_area = pd.DataFrame(chart_data_area)
-                    chart_df_area["Unit Size"] = chart_df_area["Unit Size"].astype(str)
-
-                    st.markdown(f'<h4 style="font-size: 1.2em; margin-bottom: 0.2em; margin-top: 0.2em;">Unit Cross Section Area (Supply Filter) vs. Unit Size</h4>', unsafe_allow_html=True)
-                    fig_area = px.scatter(chart_df_area,
-                                        x="Unit Cross Section Area (m²)",
-                                        y="Brand_UnitSize", # Y-axis is now Brand_UnitSize
-                                        color="Selection_Label",
-                                        text="Unit Size", # Display Unit Size next to dots
-                                        title=None,
-                                        hover_data={"Unit Size": True, "Unit Cross Section Area (m²)": True, "Full_Selection_Details": True},
-                                        color_discrete_map={
-                                            f"Left: {selected_brand1}": "green",
-                                            f"Right: {selected_brand2}": "blue"
-                                        })
-                    fig_area.update_traces(textposition='top center')
-                    fig_area.update_layout(
-                        xaxis_title="Unit Cross Section Area (m²)",
-                        yaxis_title="Brand and Unit Size", # Y-axis title updated
-                        showlegend=True,
-                        xaxis=dict(showgrid=True, gridwidth=1, gridcolor='lightgray'),
-                        yaxis=dict(showgrid=True, gridwidth=1, gridcolor='lightgray') # Added Y-axis gridlines
-                    )
-                    st.plotly_chart(fig_area, use_container_width=True)
-                else:
-                    st.info("Unit Cross Section Area (Supply Filter) data not available for charting for one or both selections, or no valid unit sizes found for the current filter criteria.")
-                unit_area_chart_displayed = True
-
-            elif chart_name == "chart1" and not chart1_displayed:
-                chart_data_1 = []
-                required_coord_cols_chart1 = [name for pair in coord_col_pairs_1_5 for name in pair]
-                can_plot_brand1_chart1 = True
-                if not filtered_df1.empty:
-                    for coord_col in required_coord_cols_chart1:
-                        if coord_col not in filtered_df1.columns or pd.isna(filtered_df1[coord_col].values[0]):
-                            can_plot_brand1_chart1 = False
-                            break
-                else:
-                    can_plot_brand1_chart1 = False
-
-                can_plot_brand2_chart1 = True
-                if not filtered_df2.empty:
-                    for coord_col in required_coord_cols_chart1:
-                        if coord_col not in filtered_df2.columns or pd.isna(filtered_df2[coord_col].values[0]):
-                            can_plot_brand2_chart1 = False
-                            break
-                else:
-                    can_plot_brand2_chart1 = False
-
-                if can_plot_brand1_chart1:
-                    for i, (x_name, y_name) in enumerate(coord_col_pairs_1_5):
-                        chart_data_1.append({
-                            'X_coord_actual': filtered_df1[x_name].values[0],
-                            'Y_coord_actual': filtered_df1[y_name].values[0],
-                            'Display_Label': f"Left: {selected_year1}-{selected_quarter1}-{selected_brand1}-{selected_unit1}-{selected_size1}",
-                            'Point_Order': i + 1
-                        })
-                
-                if can_plot_brand2_chart1:
-                    for i, (x_name, y_name) in enumerate(coord_col_pairs_1_5):
-                        chart_data_1.append({
-                            'X_coord_actual': filtered_df2[x_name].values[0],
-                            'Y_coord_actual': filtered_df2[y_name].values[0],
-                            'Display_Label': f"Right: {selected_year2}-{selected_quarter2}-{selected_brand2}-{selected_unit2}-{selected_size2}",
-                            'Point_Order': i + 1
-                        })
-                
-                if chart_data_1:
-                    st.markdown(f'<h4 style="font-size: 1.2em; margin-bottom: 0.2em; margin-top: 0.2em;">Internal Cross Section area (Supply Filter)</h4>', unsafe_allow_html=True)
-                    chart_df_1 = pd.DataFrame(chart_data_1)
-                    chart_df_1 = chart_df_1.sort_values(by=['Display_Label', 'Point_Order'])
-                    
-                    fig1 = px.line(chart_df_1,
-                                x="X_coord_actual",
-                                y="Y_coord_actual",
-                                color="Display_Label",
-                                line_group="Display_Label",
-                                markers=True,
-                                title=None,
-                                hover_data={'X_coord_actual': True, 'Y_coord_actual': True},
-                                color_discrete_map={
-                                    f"Left: {selected_year1}-{selected_quarter1}-{selected_brand1}-{selected_unit1}-{selected_size1}": "green",
-                                    f"Right: {selected_year2}-{selected_quarter2}-{selected_brand2}-{selected_unit2}-{selected_size2}": "blue"
-                                })
-                    
-                    fig1.update_layout(
-                        xaxis_title="Unit internal width_Supply Filter (mm)",
-                        yaxis_title="Unit internal height_Supply Filter (mm)",
-                        hovermode="x unified",
-                        legend_title_text="Selection - Year-Quarter-Brand-Unit-Size",
-                        xaxis_constrain="domain",
-                        yaxis_constrain="domain",
-                        showlegend=True
-                    )
-                    fig1.update_yaxes(scaleanchor="x", scaleratio=1)
-                    st.plotly_chart(fig1, use_container_width=True)
-                elif not can_plot_brand1_chart1 and not can_plot_brand2_chart1:
-                    st.warning("No complete coordinate data (X1-X5, Y1-Y5) found for selected units to generate Chart 1. Please ensure data is present and valid for both selections.")
-                chart1_displayed = True
-
-            elif chart_name == "chart2" and not chart2_displayed:
-                chart_data_2 = []
-                required_coord_cols_chart2 = [name for pair in coord_col_pairs_6_10 for name in pair]
-
-                can_plot_brand1_chart2 = True
-                if not filtered_df1.empty:
-                    for coord_col in required_coord_cols_chart2:
-                        if coord_col not in filtered_df1.columns or pd.isna(filtered_df1[coord_col].values[0]):
-                            can_plot_brand1_chart2 = False
-                            break
-                else:
-                    can_plot_brand1_chart2 = False
-
-                can_plot_brand2_chart2 = True
-                if not filtered_df2.empty:
-                    for coord_col in required_coord_cols_chart2:
-                        if coord_col not in filtered_df2.columns or pd.isna(filtered_df2[coord_col].values[0]):
-                            can_plot_brand2_chart2 = False
-                            break
-                else:
-                    can_plot_brand2_chart2 = False
-
-                if can_plot_brand1_chart2:
-                    for i, (x_name, y_name) in enumerate(coord_col_pairs_6_10):
-                        chart_data_2.append({
-                            'X_coord_actual': filtered_df1[x_name].values[0],
-                            'Y_coord_actual': filtered_df1[y_name].values[0],
-                            'Display_Label': f"Left: {selected_year1}-{selected_quarter1}-{selected_brand1}-{selected_unit1}-{selected_size1}",
-                            'Point_Order': i + 1
-                        })
-                
-                if can_plot_brand2_chart2:
-                    for i, (x_name, y_name) in enumerate(coord_col_pairs_6_10):
-                        chart_data_2.append({
-                            'X_coord_actual': filtered_df2[x_name].values[0],
-                            'Y_coord_actual': filtered_df2[y_name].values[0],
-                            'Display_Label': f"Right: {selected_year2}-{selected_quarter2}-{selected_brand2}-{selected_unit2}-{selected_size2}",
-                            'Point_Order': i + 1
-                        })
-                
-                if chart_data_2:
-                    st.markdown(f'<h4 style="font-size: 1.2em; margin-bottom: 0.2em; margin-top: 0.2em;">Internal Cross Section area (Supply Fan)</h4>', unsafe_allow_html=True)
-                    chart_df_2 = pd.DataFrame(chart_data_2)
-                    chart_df_2 = chart_df_2.sort_values(by=['Display_Label', 'Point_Order'])
-                    
-                    fig2 = px.line(chart_df_2,
-                                x="X_coord_actual",
-                                y="Y_coord_actual",
-                                color="Display_Label",
-                                line_group="Display_Label",
-                                markers=True,
-                                title=None,
-                                hover_data={'X_coord_actual': True, 'Y_coord_actual': True},
-                                color_discrete_map={
-                                    f"Left: {selected_year1}-{selected_quarter1}-{selected_brand1}-{selected_unit1}-{selected_size1}": "green",
-                                    f"Right: {selected_year2}-{selected_quarter2}-{selected_brand2}-{selected_unit2}-{selected_size2}": "blue"
-                                })
-                    
-                    fig2.update_layout(
-                        xaxis_title="Unit internal width_Supply Fan (mm)",
-                        yaxis_title="Unit internal height_Supply Fan (mm)",
-                        hovermode="x unified",
-                        legend_title_text="Selection - Year-Quarter-Brand-Unit-Size",
-                        xaxis_constrain="domain",
-                        yaxis_constrain="domain",
-                        showlegend=True
-                    )
-                    fig2.update_yaxes(scaleanchor="x", scaleratio=1)
-                    st.plotly_chart(fig2, use_container_width=True)
-                elif not can_plot_brand1_chart2 and not can_plot_brand2_chart2:
-                    st.warning("No complete coordinate data (X6-X10, Y6-Y10) found for selected units to generate Chart 2. Please ensure data is present and valid for both selections.")
-                chart2_displayed = True
-
-            elif chart_name == "chart3" and not chart3_displayed:
-                chart_data_3 = []
-                required_coord_cols_chart3 = [name for pair in coord_col_pairs_11_15 for name in pair]
-
-                can_plot_brand1_chart3 = True
-                if not filtered_df1.empty:
-                    all_coords_present_and_zero_or_na1 = True
-                    for c in required_coord_cols_chart3:
-                        if c in filtered_df1.columns and pd.notna(filtered_df1[c].values[0]) and filtered_df1[c].values[0] != 0:
-                            all_coords_present_and_zero_or_na1 = False
-                            break
-                    
-                    if all_coords_present_and_zero_or_na1 and duct_connection_diameter_col in filtered_df1.columns and pd.notna(filtered_df1[duct_connection_diameter_col].values[0]):
-                        diameter1 = filtered_df1[duct_connection_diameter_col].values[0]
-                        radius1 = diameter1 / 2.0
-                        center_x1 = diameter1 / 2.0
-                        center_y1 = diameter1 / 2.0
-                        theta = np.linspace(0, 2*np.pi, 100)
-                        for t in theta:
-                            chart_data_3.append({
-                                'X_coord_actual': center_x1 + radius1 * np.cos(t),
-                                'Y_coord_actual': center_y1 + radius1 * np.sin(t),
-                                'Display_Label': f"Left: {selected_year1}-{selected_quarter1}-{selected_brand1}-{selected_unit1}-{selected_size1}",
-                                'Point_Order': 0
-                            })
-                        chart_data_3.append({
-                            'X_coord_actual': center_x1 + radius1 * np.cos(0),
-                            'Y_coord_actual': center_y1 + radius1 * np.sin(0),
-                            'Display_Label': f"Left: {selected_year1}-{selected_quarter1}-{selected_brand1}-{selected_unit1}-{selected_size1}",
-                            'Point_Order': 0
-                        })
-                    elif not all_coords_present_and_zero_or_na1:
-                        for i, (x_name, y_name) in enumerate(coord_col_pairs_11_15):
-                            if x_name in filtered_df1.columns and y_name in filtered_df1.columns and \
-                               pd.notna(filtered_df1[x_name].values[0]) and pd.notna(filtered_df1[y_name].values[0]):
-                                chart_data_3.append({
-                                    'X_coord_actual': filtered_df1[x_name].values[0],
-                                    'Y_coord_actual': filtered_df1[y_name].values[0],
-                                    'Display_Label': f"Left: {selected_year1}-{selected_quarter1}-{selected_brand1}-{selected_unit1}-{selected_size1}",
-                                    'Point_Order': i + 1
-                                })
-                            else:
-                                can_plot_brand1_chart3 = False
-                                st.info(f"Incomplete coordinate data (X11-X15, Y11-Y15) for 'Left: {selected_brand1} - {selected_unit1}'. Chart 3 may not include this selection.")
-                                break
-                    else:
+    # Table layout shared by every block of the comparison table
+    table_unit_labels = [f"{selected_brand1} - {selected_unit1} - {selected_size1}", f"{selected_brand2} - {selected_unit2} - {selected_size2}"]
+    table_colors = ["green", "blue"]
+    # Legend labels of the two selections in the charts, and the hover names of the outline charts
+    chart_label1 = f"Left: {selected_year1}-{selected_quarter1}-{selected_brand1}-{selected_unit1}-{selected_size1}"
+    chart_label2 = f"Right: {selected_year2}-{selected_quarter2}-{selected_brand2}-{selected_unit2}-{selected_size2}"
+    chart_hover_names = ("Display_Label", "X_coord_actual", "Y_coord_actual")
+
+    # Every size of the selected unit/recovery type, of the selected wheel type or lamels material, for the unit area chart
+    area_filter1 = (None, None)
+    if selected_recovery1 == "RRG" and type_col and selected_type1:
+        area_filter1 = (type_col, selected_type1)
+    elif selected_recovery1 in ["HEX", "PCR"] and material_col and selected_material1:
+        area_filter1 = (material_col, selected_material1)
+    area_filter2 = (None, None)
+    if selected_recovery2 == "RRG" and type_col and selected_type2:
+        area_filter2 = (type_col, selected_type2)
+    elif selected_recovery2 in ["HEX", "PCR"] and material_col and selected_material2:
+        area_filter2 = (material_col, selected_material2)
+
+    # Charts are recorded once per data version and their own inputs and replayed for any selection
+    # pair that shares them (see comparison_cache): the outline and heater charts show each side's row
+    # under its legend label, the unit area chart each side's sizes with their labels
+    chart_outputs = load_artifact("chart_outputs")
+    unit_chart_inputs = ((chart_label1, rows1[0]), (chart_label2, rows2[0]))
+    area_chart_inputs = (
+        (selected_year1, selected_quarter1, selected_brand1, selected_unit1, tuple(recovery_node1["rows"]), area_filter1),
+        (selected_year2, selected_quarter2, selected_brand2, selected_unit2, tuple(recovery_node2["rows"]), area_filter2),
+    )
+
+    # One fragment per section of the table (see display_layout). The block before the first section
+    # header is always drawn; every other section is a collapsed expander whose rows and charts are
+    # only built while it is open. Opening or closing a section reruns just that fragment, not the
+    # sidebar cascade, the image panels or the other sections. Within a block, rows are drawn as one
+    # table element per run between two charts.
+    @st.fragment
+    def comparison_section(section_title, section_items):
+        if section_title is None:
+            section = st.container()
+        else:
+            section = st.expander(section_title, key=f"section_{section_title}", on_change="rerun")
+            if not section.open:
+                return
+
+        with section:
+            table_items = []
+            first_table_block = True
+            for item in section_items:
+                if item["type"] == "row":
+                    table_items.append(item)
+
+                elif item["type"] == "chart":
+                    render_comparison_table(table_items, comparison_values, table_unit_labels, table_colors, column_header=first_table_block, metrics=comparison_metrics)
+                    table_items = []
+                    first_table_block = False
+
+                    chart_name = item["name"]
+                    # Drawn once per data version and chart inputs; later runs replay the recorded output
+                    chart_key = (chart_name, area_chart_inputs if chart_name == "unit_area_chart" else unit_chart_inputs)
+                    chart_calls = chart_outputs.lookup(chart_key)
+                    if chart_calls is not None:
+                        replay(chart_calls)
+                        continue
+                    chart_out = ChartOutput()
+                    if chart_name == "unit_area_chart":
+                        unit_area_col_name = schema.unit_area_col
+                        area_points1 = []
+                        area_points2 = []
+                        if unit_area_col_name and unit_area_col_name in schema.columns and size_col in schema.columns:
+                            area_points1 = load_artifact("chart_traces", selected_year1).unit_areas(recovery_node1["rows"], *area_filter1)
+                            area_points2 = load_artifact("chart_traces", selected_year2).unit_areas(recovery_node2["rows"], *area_filter2)
+
+                        if area_points1 or area_points2:
+                            chart_out.markdown(f'<h4 style="font-size: 1.2em; margin-bottom: 0.2em; margin-top: 0.2em;">Unit Cross Section Area (Supply Filter) vs. Unit Size</h4>', unsafe_allow_html=True)
+                            area_traces = []
+                            if area_points1:
+                                area_traces.append(unit_area_trace(area_points1, selected_brand1, f"Left: {selected_brand1}", "green",
+                                                                   details=[f"Left: {selected_year1}-{selected_quarter1}-{selected_brand1}-{selected_unit1}-{size}" for _, size in area_points1]))
+                            if area_points2:
+                                area_traces.append(unit_area_trace(area_points2, selected_brand2, f"Right: {selected_brand2}", "blue",
+                                                                   details=[f"Right: {selected_year2}-{selected_quarter2}-{selected_brand2}-{selected_unit2}-{size}" for _, size in area_points2]))
+                            fig_area = comparison_figure(area_traces, "Selection_Label")
+                            fig_area.update_traces(textposition='top center')
+                            fig_area.update_layout(
+                                xaxis_title="Unit Cross Section Area (m²)",
+                                yaxis_title="Brand and Unit Size", # Y-axis title updated
+                                showlegend=True,
+                                xaxis=dict(showgrid=True, gridwidth=1, gridcolor='lightgray'),
+                                yaxis=dict(showgrid=True, gridwidth=1, gridcolor='lightgray') # Added Y-axis gridlines
+                            )
+                            chart_out.plotly_chart(fig_area, use_container_width=True)
+                        else:
+                            chart_out.info("Unit Cross Section Area (Supply Filter) data not available for charting for one or both selections, or no valid unit sizes found for the current filter criteria.")
+
+                    elif chart_name == "chart1":
+                        chart_traces_1 = []
+                        if traces1["filter_polygon"] is not None:
+                            chart_traces_1.append(line_trace(traces1["filter_polygon"], chart_label1, "green", hover_names=chart_hover_names))
+                        if traces2["filter_polygon"] is not None:
+                            chart_traces_1.append(line_trace(traces2["filter_polygon"], chart_label2, "blue", hover_names=chart_hover_names))
+
+                        if chart_traces_1:
+                            chart_out.markdown(f'<h4 style="font-size: 1.2em; margin-bottom: 0.2em; margin-top: 0.2em;">Internal Cross Section area (Supply Filter)</h4>', unsafe_allow_html=True)
+                            fig1 = comparison_figure(chart_traces_1, "Display_Label")
+                            fig1.update_layout(
+                                xaxis_title="Unit internal width_Supply Filter (mm)",
+                                yaxis_title="Unit internal height_Supply Filter (mm)",
+                                hovermode="x unified",
+                                legend_title_text="Selection - Year-Quarter-Brand-Unit-Size",
+                                xaxis_constrain="domain",
+                                yaxis_constrain="domain",
+                                showlegend=True
+                            )
+                            fig1.update_yaxes(scaleanchor="x", scaleratio=1)
+                            chart_out.plotly_chart(fig1, use_container_width=True)
+                        else:
+                            chart_out.warning("No complete coordinate data (X1-X5, Y1-Y5) found for selected units to generate Chart 1. Please ensure data is present and valid for both selections.")
+
+                    elif chart_name == "chart2":
+                        chart_traces_2 = []
+                        if traces1["fan_polygon"] is not None:
+                            chart_traces_2.append(line_trace(traces1["fan_polygon"], chart_label1, "green", hover_names=chart_hover_names))
+                        if traces2["fan_polygon"] is not None:
+                            chart_traces_2.append(line_trace(traces2["fan_polygon"], chart_label2, "blue", hover_names=chart_hover_names))
+
+                        if chart_traces_2:
+                            chart_out.markdown(f'<h4 style="font-size: 1.2em; margin-bottom: 0.2em; margin-top: 0.2em;">Internal Cross Section area (Supply Fan)</h4>', unsafe_allow_html=True)
+                            fig2 = comparison_figure(chart_traces_2, "Display_Label")
+                            fig2.update_layout(
+                                xaxis_title="Unit internal width_Supply Fan (mm)",
+                                yaxis_title="Unit internal height_Supply Fan (mm)",
+                                hovermode="x unified",
+                                legend_title_text="Selection - Year-Quarter-Brand-Unit-Size",
+                                xaxis_constrain="domain",
+                                yaxis_constrain="domain",
+                                showlegend=True
+                            )
+                            fig2.update_yaxes(scaleanchor="x", scaleratio=1)
+                            chart_out.plotly_chart(fig2, use_container_width=True)
+                        else:
+                            chart_out.warning("No complete coordinate data (X6-X10, Y6-Y10) found for selected units to generate Chart 2. Please ensure data is present and valid for both selections.")
+
+                    elif chart_name == "chart3":
+                        chart_traces_3 = []
+
                         can_plot_brand1_chart3 = False
-                        st.info(f"Coordinate data (X11-X15, Y11-Y15) for 'Left: {selected_brand1} - {selected_unit1}' is all zeros/NA, but 'Duct connection Diameter' is missing or invalid. Cannot draw circle for Chart 3.")
-                else:
-                    can_plot_brand1_chart3 = False
-
-                can_plot_brand2_chart3 = True
-                if not filtered_df2.empty:
-                    all_coords_present_and_zero_or_na2 = True
-                    for c in required_coord_cols_chart3:
-                        if c in filtered_df2.columns and pd.notna(filtered_df2[c].values[0]) and filtered_df2[c].values[0] != 0:
-                            all_coords_present_and_zero_or_na2 = False
-                            break
-
-                    if all_coords_present_and_zero_or_na2 and duct_connection_diameter_col in filtered_df2.columns and pd.notna(filtered_df2[duct_connection_diameter_col].values[0]):
-                        diameter2 = filtered_df2[duct_connection_diameter_col].values[0]
-                        radius2 = diameter2 / 2.0
-                        center_x2 = diameter2 / 2.0
-                        center_y2 = diameter2 / 2.0
-                        theta = np.linspace(0, 2*np.pi, 100)
-                        for t in theta:
-                            chart_data_3.append({
-                                'X_coord_actual': center_x2 + radius2 * np.cos(t),
-                                'Y_coord_actual': center_y2 + radius2 * np.sin(t),
-                                'Display_Label': f"Right: {selected_year2}-{selected_quarter2}-{selected_brand2}-{selected_unit2}-{selected_size2}",
-                                'Point_Order': 0
-                            })
-                        chart_data_3.append({
-                            'X_coord_actual': center_x2 + radius2 * np.cos(0),
-                            'Y_coord_actual': center_y2 + radius2 * np.sin(0),
-                            'Display_Label': f"Right: {selected_year2}-{selected_quarter2}-{selected_brand2}-{selected_unit2}-{selected_size2}",
-                            'Point_Order': 0
-                        })
-                    elif not all_coords_present_and_zero_or_na2:
-                        for i, (x_name, y_name) in enumerate(coord_col_pairs_11_15):
-                            if x_name in filtered_df2.columns and y_name in filtered_df2.columns and \
-                               pd.notna(filtered_df2[x_name].values[0]) and pd.notna(filtered_df2[y_name].values[0]):
-                                chart_data_3.append({
-                                    'X_coord_actual': filtered_df2[x_name].values[0],
-                                    'Y_coord_actual': filtered_df2[y_name].values[0],
-                                    'Display_Label': f"Right: {selected_year2}-{selected_quarter2}-{selected_brand2}-{selected_unit2}-{selected_size2}",
-                                    'Point_Order': i + 1
-                                })
+                        if not filtered_df1.empty:
+                            duct_outline1 = traces1["duct_outline"]
+                            if duct_outline1 is None:
+                                chart_out.info(f"Coordinate data (X11-X15, Y11-Y15) for 'Left: {selected_brand1} - {selected_unit1}' is all zeros/NA, but 'Duct connection Diameter' is missing or invalid. Cannot draw circle for Chart 3.")
                             else:
-                                can_plot_brand2_chart3 = False
-                                st.info(f"Incomplete coordinate data (X11-X15, Y11-Y15) for 'Right: {selected_brand2} - {selected_unit2}'. Chart 3 may not include this selection.")
-                                break
-                    else:
+                                if duct_outline1["x"]:
+                                    chart_traces_3.append(line_trace(duct_outline1, chart_label1, "green", hover_names=chart_hover_names))
+                                can_plot_brand1_chart3 = traces1["duct_outline_complete"]
+                                if not can_plot_brand1_chart3:
+                                    chart_out.info(f"Incomplete coordinate data (X11-X15, Y11-Y15) for 'Left: {selected_brand1} - {selected_unit1}'. Chart 3 may not include this selection.")
+
                         can_plot_brand2_chart3 = False
-                        st.info(f"Coordinate data (X11-X15, Y11-Y15) for 'Right: {selected_brand2} - {selected_unit2}' is all zeros/NA, but 'Duct connection Diameter' is missing or invalid. Cannot draw circle for Chart 3.")
-                else:
-                    can_plot_brand2_chart3 = False
-
-                if chart_data_3:
-                    st.markdown(f'<h4 style="font-size: 1.2em; margin-bottom: 0.2em; margin-top: 0.2em;">Supply Duct connection, mm</h4>', unsafe_allow_html=True)
-                    chart_df_3 = pd.DataFrame(chart_data_3)
-                    chart_df_3 = chart_df_3.sort_values(by=['Display_Label', 'Point_Order'])
-                    
-                    fig3 = px.line(chart_df_3,
-                                x="X_coord_actual",
-                                y="Y_coord_actual",
-                                color="Display_Label",
-                                line_group="Display_Label",
-                                markers=True,
-                                title=None,
-                                hover_data={'X_coord_actual': True, 'Y_coord_actual': True},
-                                color_discrete_map={
-                                    f"Left: {selected_year1}-{selected_quarter1}-{selected_brand1}-{selected_unit1}-{selected_size1}": "green",
-                                    f"Right: {selected_year2}-{selected_quarter2}-{selected_brand2}-{selected_unit2}-{selected_size2}": "blue"
-                                })
-                    
-                    fig3.update_traces(line=dict(width=1.0))
-                    fig3.update_layout(
-                        xaxis_title="Supply Duct Connection Width (mm)",
-                        yaxis_title="Supply Duct Connection Height (mm)",
-                        hovermode="x unified",
-                        legend_title_text="Selection - Year-Quarter-Brand-Unit-Size",
-                        xaxis_constrain="domain",
-                        yaxis_constrain="domain",
-                        showlegend=True
-                    )
-                    fig3.update_yaxes(scaleanchor="x", scaleratio=1)
-                    st.plotly_chart(fig3, use_container_width=True)
-                elif not can_plot_brand1_chart3 and not can_plot_brand2_chart3:
-                    st.warning("No complete coordinate data (X11-X15, Y11-Y15) or valid 'Duct connection Diameter' found for selected units to generate Chart 3. Please ensure data is present and valid for both selections.")
-                chart3_displayed = True
-
-            elif chart_name == "electrical_heater_chart" and not electrical_heater_chart_displayed:
-                electrical_heater_chart_data = []
-
-                if not filtered_df1.empty and capacity_range1_col in filtered_df1.columns and \
-                   capacity_range2_col in filtered_df1.columns and capacity_range3_col in filtered_df1.columns:
-                    electrical_heater_chart_data.append({
-                        "Capacity Range": "Capacity range1",
-                        "Value (kW)": filtered_df1[capacity_range1_col].values[0],
-                        "Selection": f"Left: {selected_year1}-{selected_quarter1}-{selected_brand1}-{selected_unit1}-{selected_size1}"
-                    })
-                    electrical_heater_chart_data.append({
-                        "Capacity Range": "Capacity range2",
-                        "Value (kW)": filtered_df1[capacity_range2_col].values[0],
-                        "Selection": f"Left: {selected_year1}-{selected_quarter1}-{selected_brand1}-{selected_unit1}-{selected_size1}"
-                    })
-                    electrical_heater_chart_data.append({
-                        "Capacity Range": "Capacity range3",
-                        "Value (kW)": filtered_df1[capacity_range3_col].values[0],
-                        "Selection": f"Left: {selected_year1}-{selected_quarter1}-{selected_brand1}-{selected_unit1}-{selected_size1}"
-                    })
-
-                if not filtered_df2.empty and capacity_range1_col in filtered_df2.columns and \
-                   capacity_range2_col in filtered_df2.columns and capacity_range3_col in filtered_df2.columns:
-                    electrical_heater_chart_data.append({
-                        "Capacity Range": "Capacity range1",
-                        "Value (kW)": filtered_df2[capacity_range1_col].values[0],
-                        "Selection": f"Right: {selected_year2}-{selected_quarter2}-{selected_brand2}-{selected_unit2}-{selected_size2}"
-                    })
-                    electrical_heater_chart_data.append({
-                        "Capacity Range": "Capacity range2",
-                        "Value (kW)": filtered_df2[capacity_range2_col].values[0],
-                        "Selection": f"Right: {selected_year2}-{selected_quarter2}-{selected_brand2}-{selected_unit2}-{selected_size2}"
-                    })
-                    electrical_heater_chart_data.append({
-                        "Capacity Range": "Capacity range3",
-                        "Value (kW)": filtered_df2[capacity_range3_col].values[0],
-                        "Selection": f"Right: {selected_year2}-{selected_quarter2}-{selected_brand2}-{selected_unit2}-{selected_size2}"
-                    })
-
-                if electrical_heater_chart_data:
-                    st.markdown(f'<h4 style="font-size: 1.2em; margin-bottom: 0.2em; margin-top: 0.2em;">Electrical Heater Capacity (kW)</h4>', unsafe_allow_html=True)
-                    electrical_heater_df = pd.DataFrame(electrical_heater_chart_data)
-                    
-                    fig_heater = px.bar(electrical_heater_df,
-                                        x="Capacity Range",
-                                        y="Value (kW)",
-                                        color="Selection",
-                                        barmode="group",
-                                        title=None,
-                                        color_discrete_map={
-                                            f"Left: {selected_year1}-{selected_quarter1}-{selected_brand1}-{selected_unit1}-{selected_size1}": "green",
-                                            f"Right: {selected_year2}-{selected_quarter2}-{selected_brand2}-{selected_unit2}-{selected_size2}": "blue"
-                                        })
-                    
-                    fig_heater.update_layout(
-                        hovermode="x unified",
-                        legend_title_text="Selection - Year-Quarter-Brand-Unit-Size",
-                        xaxis_title="Capacity Range",
-                        yaxis_title="Capacity (kW)"
-                    )
-                    st.plotly_chart(fig_heater, use_container_width=True)
-                else:
-                    st.warning("No complete capacity data found for Electrical Heater to generate the chart.")
-                electrical_heater_chart_displayed = True
+                        if not filtered_df2.empty:
+                            duct_outline2 = traces2["duct_outline"]
+                            if duct_outline2 is None:
+                                chart_out.info(f"Coordinate data (X11-X15, Y11-Y15) for 'Right: {selected_brand2} - {selected_unit2}' is all zeros/NA, but 'Duct connection Diameter' is missing or invalid. Cannot draw circle for Chart 3.")
+                            else:
+                                if duct_outline2["x"]:
+                                    chart_traces_3.append(line_trace(duct_outline2, chart_label2, "blue", hover_names=chart_hover_names))
+                                can_plot_brand2_chart3 = traces2["duct_outline_complete"]
+                                if not can_plot_brand2_chart3:
+                                    chart_out.info(f"Incomplete coordinate data (X11-X15, Y11-Y15) for 'Right: {selected_brand2} - {selected_unit2}'. Chart 3 may not include this selection.")
+
+                        if chart_traces_3:
+                            chart_out.markdown(f'<h4 style="font-size: 1.2em; margin-bottom: 0.2em; margin-top: 0.2em;">Supply Duct connection, mm</h4>', unsafe_allow_html=True)
+                            fig3 = comparison_figure(chart_traces_3, "Display_Label")
+                            fig3.update_traces(line=dict(width=1.0))
+                            fig3.update_layout(
+                                xaxis_title="Supply Duct Connection Width (mm)",
+                                yaxis_title="Supply Duct Connection Height (mm)",
+                                hovermode="x unified",
+                                legend_title_text="Selection - Year-Quarter-Brand-Unit-Size",
+                                xaxis_constrain="domain",
+                                yaxis_constrain="domain",
+                                showlegend=True
+                            )
+                            fig3.update_yaxes(scaleanchor="x", scaleratio=1)
+                            chart_out.plotly_chart(fig3, use_container_width=True)
+                        elif not can_plot_brand1_chart3 and not can_plot_brand2_chart3:
+                            chart_out.warning("No complete coordinate data (X11-X15, Y11-Y15) or valid 'Duct connection Diameter' found for selected units to generate Chart 3. Please ensure data is present and valid for both selections.")
+
+                    elif chart_name == "electrical_heater_chart":
+                        heater_traces = []
+                        heater_ranges = ["Capacity range1", "Capacity range2", "Capacity range3"]
+                        if traces1["heater_capacities"] is not None:
+                            heater_traces.append(capacity_trace(traces1["heater_capacities"], heater_ranges, chart_label1, "green"))
+                        if traces2["heater_capacities"] is not None:
+                            heater_traces.append(capacity_trace(traces2["heater_capacities"], heater_ranges, chart_label2, "blue"))
+
+                        if heater_traces:
+                            chart_out.markdown(f'<h4 style="font-size: 1.2em; margin-bottom: 0.2em; margin-top: 0.2em;">Electrical Heater Capacity (kW)</h4>', unsafe_allow_html=True)
+                            fig_heater = comparison_figure(heater_traces, "Selection", barmode="group")
+                            fig_heater.update_layout(
+                                hovermode="x unified",
+                                legend_title_text="Selection - Year-Quarter-Brand-Unit-Size",
+                                xaxis_title="Capacity Range",
+                                yaxis_title="Capacity (kW)"
+                            )
+                            chart_out.plotly_chart(fig_heater, use_container_width=True)
+                        else:
+                            chart_out.warning("No complete capacity data found for Electrical Heater to generate the chart.")
+                    chart_outputs.store(chart_key, chart_out.calls)
+
+            # Rows after the last chart
+            render_comparison_table(table_items, comparison_values, table_unit_labels, table_colors, column_header=first_table_block, metrics=comparison_metrics)
+
+    for section_title, section_items in layout_plan.sections:
+        section_items = [item for item in section_items if item["type"] != "row" or item["col"] not in hidden_cols]
+        if section_items: # Empty when every row of the section is hidden by the diff-only view
+            comparison_section(section_title, section_items)
 
 
 else:
@@ -0,0 +1,82 @@
+import os
+import json
+import logging
+import argparse
+
+from data_loader import DATA_FILE, DATA_SHEET, list_partitions, read_workbook, read_workbook_header
+from data_schema import resolve_schema
+from image_index import IMAGES_DIR, image_files
+from thumbnail_cache import MANIFEST_FILE, ThumbnailCache
+
+# Offline asset build, run from the app directory before serving:
+#
+#     python build_assets.py
+#
+# Walks images/ and every file named in the Brand logo / Unit photo columns, writes each image's
+# thumbnails into the thumbnail cache and records every image's dimensions in a manifest, so the apps
+# size the logo and photo pairs and send their thumbnails without opening an image while serving a
+# request (see thumbnail_cache).
+#
+# Thumbnails are made at the heights app_2307_4 shows: both images of a pair at the taller one's
+# height, i.e. an image at its own height or at that of a taller image of the same column.
+
+logger = logging.getLogger(__name__)
+
+
+def referenced_images(source=DATA_FILE, sheet_name=DATA_SHEET):
+    # {column: image names} of the Brand logo / Unit photo columns over every partition of the data
+    partitions = list_partitions(source, sheet_name)
+    if not partitions:
+        return {}
+    schema = resolve_schema(read_workbook_header(partitions[0].path, sheet_name=partitions[0].sheet_name))
+    cols = [col for col in (schema.logo_col, schema.unit_photo_col) if col]
+    names = {col: set() for col in cols}
+    for partition in partitions:
+        df = read_workbook(partition.path, sheet_name=partition.sheet_name, columns=cols, compact_dtypes=False)
+        for col in cols:
+            if col in df.columns:
+                names[col].update(name for name in df[col].dropna().astype(str) if name.strip())
+    return names
+
+
+def build_assets(source=DATA_FILE, sheet_name=DATA_SHEET, images_dir=IMAGES_DIR):
+    thumbnails = ThumbnailCache(images_dir)
+    columns = referenced_images(source, sheet_name)
+
+    sources = {}
+    for name in sorted(image_files(images_dir).union(*columns.values())):
+        try:
+            sources[name] = thumbnails.source(name)
+        except Exception as e:
+            logger.warning("Skipping images/%s: %s", name, e)
+
+    # Heights each image is shown at next to another image of the same column
+    shown_heights = {name: {height} for name, (_, _, height) in sources.items()}
+    for names in columns.values():
+        column_heights = {sources[name][2] for name in names if name in sources}
+        for name in names:
+            if name in sources:
+                shown_heights[name].update(height for height in column_heights if height > sources[name][2])
+
+    manifest = {}
+    for name, (digest, width, height) in sorted(sources.items()):
+        for shown_height in sorted(shown_heights[name]):
+            thumbnails.thumbnail(name, shown_height)
+        stat = os.stat(os.path.join(images_dir, name))
+        manifest[name] = {"digest": digest, "width": width, "height": height, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+    # Write to a temp file and rename so running apps never read a half-written manifest
+    manifest_path = os.path.join(thumbnails.cache_dir, MANIFEST_FILE)
+    os.makedirs(thumbnails.cache_dir, exist_ok=True)
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"images": manifest}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+    logger.info("%d images, %d thumbnails in %s", len(manifest), sum(len(heights) for heights in shown_heights.values()), thumbnails.cache_dir)
+    return manifest
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description="Prebuild the logo and photo thumbnails and their manifest").parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    build_assets()
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Comparison charts assembled from plain go.Scatter / go.Bar dicts instead of plotly express.
+# px.line / px.scatter / px.bar built and validated a throwaway DataFrame per chart on every run,
+# yet the geometry of a row -- the supply filter and fan section polygons, the duct connection
+# outline, the electrical heater capacities and the unit area of each size -- only changes with the
+# data. It is computed once per data version and row (see ChartTraces); a chart then only adds each
+# unit's label and colour to its fragments and puts them into one go.Figure.
+#
+# The figures look as plotly express drew them: same trace modes, "<name>=<value>" hover lines and
+# legend/margin defaults, with the traces in unit order. Fragments are shared between sessions, so
+# callers must not modify them.
+
+CIRCLE_POINTS = 100 # Points on a round duct outline, before the closing point
+LINE_HOVER = ("Label", "X", "Y") # Hover names of a line chart's label, x and y
+
+# Fragments of a row (or of an empty selection):
+#   filter_polygon / fan_polygon  - {"type": "scatter", "x": [...], "y": [...]}, None when incomplete
+#   duct_outline                  - same, the rectangle (up to its first incomplete point) or the
+#                                   circle of data_quality's duct_shape; None for "none"
+#   duct_outline_complete         - False when the rectangle stopped at an incomplete point
+#   heater_capacities             - [Capacity range1, range2, range3], None when incomplete
+NO_TRACES = {"filter_polygon": None, "fan_polygon": None, "duct_outline": None, "duct_outline_complete": False,
+             "heater_capacities": None}
+
+
+def _outline(row, coord_col_pairs):
+    # Points of the row's coordinate pairs up to the first incomplete one, and whether all were complete
+    xs, ys = [], []
+    for x_name, y_name in coord_col_pairs:
+        if x_name not in row or y_name not in row or pd.isna(row[x_name]) or pd.isna(row[y_name]):
+            return {"type": "scatter", "x": xs, "y": ys}, False
+        xs.append(row[x_name])
+        ys.append(row[y_name])
+    return {"type": "scatter", "x": xs, "y": ys}, True
+
+
+def _circle(diameter):
+    # Closed circle touching both axes
+    radius = diameter / 2.0
+    theta = np.linspace(0, 2 * np.pi, CIRCLE_POINTS)
+    xs = (radius + radius * np.cos(theta)).tolist() + [radius + radius * np.cos(0)]
+    ys = (radius + radius * np.sin(theta)).tolist() + [radius + radius * np.sin(0)]
+    return {"type": "scatter", "x": xs, "y": ys}
+
+
+def row_traces(row, flags, schema):
+    # row / flags: one row of the wide frame and of its row flags (see data_quality), as dicts
+    traces = dict(NO_TRACES)
+    if flags["has_filter_polygon"]:
+        traces["filter_polygon"] = _outline(row, schema.coord_col_pairs_1_5)[0]
+    if flags["has_fan_polygon"]:
+        traces["fan_polygon"] = _outline(row, schema.coord_col_pairs_6_10)[0]
+    if flags["duct_shape"] == "rect":
+        traces["duct_outline"], traces["duct_outline_complete"] = _outline(row, schema.coord_col_pairs_11_15)
+    elif flags["duct_shape"] == "circle":
+        traces["duct_outline"], traces["duct_outline_complete"] = _circle(row[schema.duct_connection_diameter_col]), True
+    if flags["has_heater_capacities"]:
+        traces["heater_capacities"] = [row[schema.capacity_range1_col], row[schema.capacity_range2_col], row[schema.capacity_range3_col]]
+    return traces
+
+
+class ChartTraces:
+    # Chart fragments of one year's rows, built on first use and kept for the data version
+    def __init__(self, snapshot, year):
+        self._snapshot = snapshot
+        self._year = year
+        self._rows = {}
+        self._unit_areas = {}
+
+    def unit(self, rows):
+        # Fragments of a selection's first row (the row its table column shows); NO_TRACES when empty
+        if len(rows) == 0:
+            return NO_TRACES
+        label = rows[0]
+        traces = self._rows.get(label)
+        if traces is None:
+            # Two sessions may build the same row at once; both results are identical
+            row = self._snapshot.get("df", self._year).loc[[label]].iloc[0].to_dict()
+            flags = self._snapshot.get("row_flags", self._year).loc[[label]].iloc[0].to_dict()
+            traces = self._rows.setdefault(label, row_traces(row, flags, self._snapshot.get("schema")))
+        return traces
+
+    def unit_areas(self, rows, filter_col=None, filter_value=None):
+        # (unit area, unit size) of the rows that have both, in row order, optionally only the rows
+        # where filter_col == filter_value (the selected wheel type / lamels material)
+        key = (tuple(rows), filter_col, filter_value)
+        points = self._unit_areas.get(key)
+        if points is None:
+            schema = self._snapshot.get("schema")
+            df = self._snapshot.get("df", self._year).loc[rows]
+            if filter_col:
+                df = df[df[filter_col] == filter_value]
+            df = df[df[schema.unit_area_col].notna() & df[schema.size_col].notna()]
+            points = self._unit_areas.setdefault(key, list(zip(df[schema.unit_area_col].tolist(), df[schema.size_col].tolist())))
+        return points
+
+
+def _hovertemplate(label_name, label, *fields):
+    lines = [f"{label_name}={label}"] + [f"{name}={value}" for name, value in fields]
+    return "<br>".join(lines) + "<extra></extra>"
+
+
+def line_trace(outline, label, color, markers=True, hover_names=LINE_HOVER):
+    # One unit's outline fragment, as px.line(..., color=<label>, markers=markers) drew it
+    label_name, x_name, y_name = hover_names
+    return dict(outline, name=label, legendgroup=label, mode="lines+markers" if markers else "lines",
+                line=dict(color=color, dash="solid"), marker=dict(symbol="circle"), orientation="v", showlegend=True,
+                hovertemplate=_hovertemplate(label_name, label, (x_name, "%{x}"), (y_name, "%{y}")))
+
+
+def unit_area_trace(points, brand, label, color, details=None):
+    # One unit's sizes on the unit area chart: a dot per size at (area, "<brand> - Size <size>"),
+    # labelled with the size; details adds a hover line per size
+    sizes = [str(size) for _, size in points]
+    trace = dict(type="scatter", x=[area for area, _ in points], y=[f"{brand} - Size {size}" for _, size in points],
+                 text=sizes, name=label, legendgroup=label, mode="markers+text", marker=dict(color=color, symbol="circle"),
+                 orientation="h", showlegend=True)
+    fields = [("Unit Cross Section Area (m²)", "%{x}"), ("Brand_UnitSize", "%{y}")]
+    if details is None:
+        fields.append(("Unit Size", "%{text}"))
+    else:
+        trace["customdata"] = [[size, detail] for size, detail in zip(sizes, details)]
+        fields += [("Unit Size", "%{customdata[0]}"), ("Full_Selection_Details", "%{customdata[1]}")]
+    trace["hovertemplate"] = _hovertemplate("Selection_Label", label, *fields)
+    return trace
+
+
+def capacity_trace(capacities, range_names, label, color):
+    # One unit's heater capacity ranges, as px.bar(..., color=<label>, barmode="group") drew them
+    return dict(type="bar", x=list(range_names), y=capacities, name=label, legendgroup=label, offsetgroup=label,
+                alignmentgroup="True", marker=dict(color=color, pattern=dict(shape="")), orientation="v",
+                showlegend=True, textposition="auto",
+                hovertemplate=_hovertemplate("Selection", label, ("Capacity Range", "%{x}"), ("Value (kW)", "%{y}")))
+
+
+def comparison_figure(traces, legend_title, title=None, **layout):
+    # The traces in one figure with plotly express's layout defaults; layout as for fig.update_layout()
+    fig = go.Figure(data=traces, layout=dict(legend=dict(title=dict(text=legend_title), tracegroupgap=0)))
+    if title is None:
+        fig.update_layout(margin=dict(t=60))
+    else:
+        fig.update_layout(title_text=title)
+    fig.update_layout(**layout)
+    return fig
@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+
+# Results of a comparison that depend only on the final selections: the parameter x unit matrix, the
+# metric deltas/ranks, the layout plan and the CSV export. Users switch back and forth between the
+# same few unit pairs, so these are kept per selection in a bounded LRU cache, keyed by each side's
+# tuple of final selection keys (year, quarter, region, brand, unit, recovery, size, type, material).
+#
+# The drawn charts (see comparison_table.ChartOutput) are kept in a second cache of the same kind,
+# keyed by each chart's own inputs rather than by the whole pair: the outline and heater charts by
+# the row each side shows, the unit area chart by the rows and filter of each side. Changing one
+# side's size then only redraws the charts that show that size.
+#
+# The caches live on the data snapshot (see data_store), so a data reload starts with empty ones.
+# Entries are shared between sessions, so callers must not modify them.
+
+COMPARISON_CACHE_SIZE = 32 # Selections kept per data version; the least recently used is dropped
+CHART_CACHE_SIZE = 128 # Recorded chart outputs kept per data version
+
+
+class Comparison:
+    def __init__(self, matrix, metrics, layout_plan, csv_string):
+        self.matrix = matrix
+        self.metrics = metrics
+        self.layout_plan = layout_plan
+        self.csv_string = csv_string
+
+
+class ComparisonCache:
+    def __init__(self, max_entries=COMPARISON_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        # The cached entry for key, or build()'s result on a miss
+        entry = self.lookup(key)
+        if entry is None:
+            # Built outside the lock, so other sessions' hits don't wait; two sessions may build the
+            # same entry at once and the last one is kept
+            entry = build()
+            self.store(key, entry)
+        return entry
+
+    def lookup(self, key):
+        # The cached entry for key, or None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def store(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,161 @@
+import html
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Renders the comparison table (section headers and parameter rows of display_items_ordered) as one
+# HTML table per run of items between two charts, instead of an st.columns() row with 3+ markdown
+# elements per parameter. A rerun then sends a handful of elements to the browser instead of
+# several hundred, with the same layout: the st.columns() width ratios (parameter name column 2 parts
+# wide and each unit 3 parts by default), values centred and coloured per unit, and the column
+# headers repeated under every section header.
+#
+# render_comparison_grid() is the variant for comparisons of many units without section headers: the
+# whole matrix goes into one st.dataframe, whose grid only draws the rows in view.
+#
+# ChartOutput records what a chart section draws, so a cached comparison (see comparison_cache) can
+# replay() it on later runs instead of rebuilding the figures.
+
+PARAMETER_WIDTH = 2
+UNIT_WIDTH = 3
+
+GRID_HEIGHT = 600 # Pixels; rows below are drawn as the grid is scrolled
+
+_TABLE_STYLE = "width: 100%; border-collapse: collapse; table-layout: fixed; border: none;"
+_CELL_STYLE = "font-family: sans-serif; font-size: 16px; border: none; padding: 0.25em 0.5em;"
+_SECTION_STYLE = "text-align: center; font-size: 1.2em; margin-bottom: 0.5em; margin-top: 0.5em;"
+_METRIC_STYLE = "font-size: 0.75em; color: grey;"
+
+
+def comparison_matrix(frames, cols):
+    # Parameter x unit matrix of the values shown for each unit (the first of its selected rows), taken
+    # with one .loc[row, cols].T per unit instead of a [col].values[0] lookup per cell. Units come
+    # from different yearly frames, so they are joined column-wise; "-" where a unit has no row or
+    # lacks the column. The table and the CSV export both read from it.
+    cols = list(dict.fromkeys(col for col in cols if col is not None))
+    units = []
+    for df in frames:
+        if df.empty:
+            units.append(pd.Series("-", index=cols, dtype=object))
+        else:
+            present = [col for col in cols if col in df.columns]
+            units.append(df.loc[df.index[:1], present].T.iloc[:, 0].reindex(cols, fill_value="-"))
+    if not units:
+        return pd.DataFrame(index=cols)
+    return pd.concat(units, axis=1, ignore_index=True)
+
+
+def matrix_row(matrix, col):
+    # Values of one parameter for every unit
+    if col in matrix.index:
+        return matrix.loc[col].tolist()
+    return ["-"] * matrix.shape[1]
+
+
+def parameters_differ(matrix):
+    # True for the parameters whose value is not the same for every unit, from one comparison of the
+    # whole matrix against its first unit column; missing values and "-" count as equal
+    if matrix.shape[1] == 0:
+        return pd.Series(False, index=matrix.index)
+    values = matrix.mask(matrix.isna(), "-")
+    return values.ne(values.iloc[:, 0], axis=0).any(axis=1)
+
+
+def metric_comparison(matrix, metric_cols):
+    # Delta against the first unit (the baseline) and rank among the units (1 = best, ties share a
+    # rank) for the numeric spec rows of the matrix, as two parameter x unit frames computed for all
+    # rows at once. metric_cols maps each column to True when higher values are better (see
+    # data_schema.METRIC_FIELDS). Values are compared as float64, so compacted int8/int16 columns
+    # can't overflow; missing values and "-" get no delta and no rank.
+    cols = [col for col in metric_cols if col in matrix.index]
+    flat = pd.to_numeric(pd.Series(matrix.loc[cols].to_numpy().ravel(), dtype=object), errors="coerce")
+    values = flat.to_numpy(dtype=np.float64).reshape(len(cols), matrix.shape[1])
+
+    deltas = values - values[:, :1]
+    higher_is_better = np.array([metric_cols[col] for col in cols], dtype=bool).reshape(-1, 1)
+    scores = np.where(higher_is_better, values, -values)
+    # Units scoring better than each unit, from one (rows x units x units) comparison; NaN never compares greater
+    better_count = (scores[:, np.newaxis, :] > scores[:, :, np.newaxis]).sum(axis=2)
+    ranks = np.where(np.isnan(values), np.nan, better_count + 1)
+    return pd.DataFrame(deltas, index=cols, columns=matrix.columns), pd.DataFrame(ranks, index=cols, columns=matrix.columns)
+
+
+def _metric_note(metrics, col, unit):
+    # "Δ +1.5 · rank 2/3" under a unit's value (no delta for the baseline unit itself, or when the
+    # baseline has no value)
+    deltas, ranks = metrics
+    rank = ranks.loc[col].iloc[unit]
+    if np.isnan(rank):
+        return ""
+    delta = deltas.loc[col].iloc[unit]
+    parts = [f"Δ {delta:+g}"] if unit > 0 and not np.isnan(delta) else []
+    parts.append(f"rank {int(rank)}/{ranks.shape[1]}")
+    return f'<br><span style="{_METRIC_STYLE}">{" · ".join(parts)}</span>'
+
+
+def _column_header_row(unit_labels):
+    cells = [f'<th style="{_CELL_STYLE} text-align: left;">Parameter</th>']
+    cells += [f'<th style="{_CELL_STYLE} text-align: center;">{html.escape(str(label))}</th>' for label in unit_labels]
+    return f"<tr>{''.join(cells)}</tr>"
+
+
+def comparison_table_html(items, matrix, unit_labels, colors, column_header=False, col_widths=None, metrics=None):
+    # items: {"type": "header", "title": ...} / {"type": "row", "col": ...} entries; matrix: see
+    # comparison_matrix(); colors: value colour per unit, cycled; col_widths: relative widths as
+    # passed to st.columns(); metrics: metric_comparison() result, noted under the values of its rows
+    widths = col_widths or [PARAMETER_WIDTH] + [UNIT_WIDTH] * matrix.shape[1]
+    parts = [f'<table style="{_TABLE_STYLE}"><colgroup>']
+    parts += [f'<col style="width: {100 * width / sum(widths):.3f}%;">' for width in widths]
+    parts.append("</colgroup>")
+
+    if column_header:
+        parts.append(_column_header_row(unit_labels))
+    for item in items:
+        if item["type"] == "header":
+            parts.append(f'<tr><td colspan="{len(widths)}" style="border: none;"><h4 style="{_SECTION_STYLE}">{html.escape(str(item["title"]))}</h4></td></tr>')
+            parts.append(_column_header_row(unit_labels)) # Re-add table headers for the new section
+        elif item["type"] == "row":
+            col = item["col"]
+            cells = [f'<td style="{_CELL_STYLE}">{html.escape(str(col))}</td>']
+            has_metrics = metrics is not None and col in metrics[0].index
+            for i, value in enumerate(matrix_row(matrix, col)):
+                color = colors[i % len(colors)]
+                note = _metric_note(metrics, col, i) if has_metrics else ""
+                cells.append(f'<td style="{_CELL_STYLE} text-align: center; color: {color};">{html.escape(str(value))}{note}</td>')
+            parts.append(f"<tr>{''.join(cells)}</tr>")
+    parts.append("</table>")
+    return "".join(parts)
+
+
+def render_comparison_table(items, matrix, unit_labels, colors, column_header=False, col_widths=None, metrics=None):
+    if items or column_header:
+        st.markdown(comparison_table_html(items, matrix, unit_labels, colors, column_header, col_widths, metrics), unsafe_allow_html=True)
+
+
+def render_comparison_grid(matrix, unit_labels, height=GRID_HEIGHT):
+    # One element for the whole matrix instead of an st.columns() row per parameter. Values are shown
+    # as text, as a unit column mixes numbers and strings.
+    grid = matrix.astype(str)
+    grid.columns = list(unit_labels)
+    grid.index.name = "Parameter"
+    st.dataframe(grid, height=height)
+
+
+class ChartOutput:
+    # Stands in for `st` in a chart section: each call (st.markdown, st.plotly_chart, ...) is drawn
+    # right away and recorded. Streamlit only serializes the figures, so recorded ones can be replayed
+    # by any session.
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def draw(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return getattr(st, name)(*args, **kwargs)
+        return draw
+
+
+def replay(calls):
+    for name, args, kwargs in calls:
+        getattr(st, name)(*args, **kwargs)
@@ -0,0 +1,367 @@
+import os
+import re
+import glob
+import json
+import hashlib
+import threading
+from collections import namedtuple
+import pandas as pd
+
+# Shared loader for the "data" sheet of Data_2025.xlsx used by every app_*.py variant.
+# Parsing the workbook with openpyxl dominates cold start, so the parsed frame is kept in a Parquet
+# sidecar in a cache directory next to the workbook and re-used while the workbook is unchanged.
+
+DATA_FILE = "Data_2025.xlsx" # Path relative to the app directory, as in the original load_data()
+DATA_SHEET = "data"
+CACHE_DIR = ".data_cache" # Sidecar files live here (ignored by git)
+
+# Key stored in the Parquet schema metadata describing which workbook version produced the sidecar
+_SIDECAR_META_KEY = b"ahu_source"
+_SIDECAR_FORMAT = 2 # Sidecars of another layout are treated as stale and rewritten
+
+_parse_lock = threading.Lock() # One workbook parse at a time, so concurrent first reads share it
+_unsaved_parses = {} # Sidecar path -> (signature, frame) of the last parse whose sidecar couldn't be written
+
+# Text columns with at most this share of distinct values are stored as pandas categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+# One loadable slice of the dataset: a sheet of a workbook. `year` is known up front for year-named
+# sheets ("2024") and for "<name>_<year>.xlsx" workbooks of a directory dataset; for the plain
+# "data" sheet it is None and the years it holds are read from its Year column.
+Partition = namedtuple("Partition", ["year", "path", "sheet_name"])
+
+_YEAR_SHEET = re.compile(r"\d{4}")
+_YEAR_IN_FILE_NAME = re.compile(r"(?<!\d)(\d{4})(?!\d)")
+_VERSIONED_FILE = re.compile(r"\.([0-9a-f]{12})\.[a-z]+$") # "<name>.<version digest>.<extension>"
+
+
+def workbook_signature(path, sheet_name):
+    # mtime + size are enough to notice a re-saved workbook without hashing 1 MB on every start
+    stat = os.stat(path)
+    return {
+        "path": os.path.abspath(path),
+        "sheet": sheet_name,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+    }
+
+
+def workbook_files(source):
+    # The workbooks making up a dataset: `source` itself, or every .xlsx file of a directory
+    # (Excel's "~$" lock files excluded)
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(source, name) for name in os.listdir(source)
+            if name.endswith(".xlsx") and not name.startswith("~$")
+        )
+    return [source]
+
+
+def _file_year(path):
+    years = _YEAR_IN_FILE_NAME.findall(os.path.splitext(os.path.basename(path))[0])
+    return int(years[0]) if len(years) == 1 else None
+
+
+def list_partitions(source=DATA_FILE, sheet_name=DATA_SHEET):
+    # Partitions of a workbook or a directory of workbooks, without reading any data rows:
+    # every year-named sheet, plus the `sheet_name` sheet. In a directory, the `sheet_name` sheet
+    # of "Data_2024.xlsx" is taken to hold the 2024 rows, so history can grow one file per year
+    # without any of it being opened until that year is selected.
+    from openpyxl import load_workbook
+
+    directory_dataset = os.path.isdir(source)
+    partitions = []
+    for path in workbook_files(source):
+        workbook = load_workbook(path, read_only=True, keep_links=False)
+        try:
+            sheet_names = workbook.sheetnames
+        finally:
+            workbook.close()
+        for name in sheet_names:
+            if _YEAR_SHEET.fullmatch(name):
+                partitions.append(Partition(int(name), path, name))
+            elif name == sheet_name:
+                partitions.append(Partition(_file_year(path) if directory_dataset else None, path, name))
+    return partitions
+
+
+def _sidecar_path(path, sheet_name):
+    base_name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR, f"{base_name}.{sheet_name}.parquet")
+
+
+def _version_digest(version):
+    return hashlib.sha1(json.dumps(version, default=str).encode()).hexdigest()[:12]
+
+
+def versioned_cache_path(source, name, version, extension):
+    # Cache file for one version of a dataset: <cache dir>/<name>.<digest of version><extension>.
+    # A new version gets a new file; the old one is removed by remove_unused_versions() once no
+    # snapshot uses that version any more.
+    base_dir = source if os.path.isdir(source) else os.path.dirname(os.path.abspath(source))
+    return os.path.join(base_dir, CACHE_DIR, f"{name}.{_version_digest(version)}{extension}")
+
+
+def remove_unused_versions(source, versions):
+    # Deletes the versioned cache files of the dataset (see versioned_cache_path) that belong to none
+    # of `versions`. Open handles and memory maps of deleted files stay valid on POSIX.
+    base_name = os.path.splitext(os.path.basename(os.path.normpath(source)))[0]
+    base_dir = source if os.path.isdir(source) else os.path.dirname(os.path.abspath(source))
+    keep = {_version_digest(version) for version in versions}
+    for path in glob.glob(os.path.join(glob.escape(os.path.join(base_dir, CACHE_DIR)), f"{glob.escape(base_name)}.*")):
+        match = _VERSIONED_FILE.search(os.path.basename(path))
+        if match and match.group(1) not in keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _mixed_object_columns(df):
+    # Columns such as "Type"/"Material" hold both strings and the integer 0, which Arrow can't store
+    # in one typed column. Those are written as JSON text and decoded again on read.
+    mixed = []
+    for col in df.columns:
+        if df[col].dtype == object:
+            value_types = {type(v) for v in df[col].dropna()}
+            if len(value_types) > 1:
+                mixed.append(col)
+    return mixed
+
+
+def _fresh_sidecar_schema(sidecar, signature):
+    # Parquet schema of the sidecar if it was written from the current workbook version, else None
+    import pyarrow.parquet as pq
+
+    schema = pq.read_schema(sidecar)
+    stored = json.loads((schema.metadata or {}).get(_SIDECAR_META_KEY, b"{}"))
+    if stored.get("signature") != signature or stored.get("format") != _SIDECAR_FORMAT:
+        return None # Workbook was replaced or edited since the sidecar was written
+    return schema
+
+
+def _read_sidecar(sidecar, signature, columns=None, compact_dtypes=True):
+    # The sidecar holds the compacted frame (Parquet keeps categories and narrow types), so a compact
+    # read needs no normalize_dtypes() pass; a raw read casts back to the dtypes read_excel gave
+    import pyarrow.parquet as pq
+
+    schema = _fresh_sidecar_schema(sidecar, signature)
+    if schema is None:
+        return None
+
+    stored = json.loads(schema.metadata[_SIDECAR_META_KEY])
+    if columns is not None:
+        columns = [col for col in columns if col in schema.names]
+    table = pq.read_table(sidecar, columns=columns)
+    if not compact_dtypes:
+        table = _raw_table(table, stored["raw_dtypes"])
+    df = table.to_pandas()
+    for col in stored["json_columns"]:
+        if col in df.columns:
+            df[col] = df[col].map(lambda v: json.loads(v) if v is not None else None).astype(object)
+            if compact_dtypes and col in stored["category_columns"]:
+                df[col] = df[col].astype("category")
+    return df
+
+
+def _raw_table(table, raw_dtypes):
+    # Undoes normalize_dtypes() on the Arrow side, where casting whole columns is cheap: categories
+    # back to their values, narrowed numbers back to the read_excel dtype
+    import numpy as np
+    import pyarrow as pa
+
+    arrays = []
+    for field, column in zip(table.schema, table.columns):
+        if pa.types.is_dictionary(field.type):
+            column = column.cast(field.type.value_type)
+        elif raw_dtypes[field.name] != "object" and (pa.types.is_integer(field.type) or pa.types.is_floating(field.type)):
+            column = column.cast(pa.from_numpy_dtype(np.dtype(raw_dtypes[field.name])))
+        arrays.append(column)
+    return pa.table(arrays, names=table.column_names)
+
+
+def _write_sidecar(df, sidecar, signature):
+    # df: the frame as read_excel returned it; stored compacted, with the raw dtypes in the metadata
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    json_columns = _mixed_object_columns(df)
+    df_to_store = normalize_dtypes(df)
+    category_columns = [col for col in json_columns if isinstance(df_to_store[col].dtype, pd.CategoricalDtype)]
+    for col in json_columns:
+        df_to_store[col] = df[col].map(lambda v: None if pd.isna(v) else json.dumps(v))
+
+    table = pa.Table.from_pandas(df_to_store, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[_SIDECAR_META_KEY] = json.dumps({
+        "signature": signature, "format": _SIDECAR_FORMAT, "json_columns": json_columns,
+        "category_columns": category_columns, "raw_dtypes": {col: str(df[col].dtype) for col in df.columns},
+    }).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    # Write to a temp file and rename so concurrent replicas never read a half-written sidecar
+    os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+    tmp_path = f"{sidecar}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, sidecar)
+
+
+def write_shared_table(df, path):
+    # Publishes a frame as an uncompressed Arrow IPC (Feather v2) file that map_shared_table() maps
+    # without copying. Float NaN is written as a value rather than a null, so float columns need no
+    # fill-in copy on read; mixed str/int columns are stored as JSON text like in the sidecar.
+    import pyarrow as pa
+
+    json_columns = _mixed_object_columns(df)
+    arrays = {}
+    for col in df.columns:
+        series = df[col]
+        if col in json_columns:
+            arrays[col] = pa.array(series.map(lambda v: None if pd.isna(v) else json.dumps(v)).tolist(), type=pa.string())
+        elif series.dtype.kind == "f":
+            arrays[col] = pa.array(series.to_numpy(), from_pandas=False)
+        else:
+            arrays[col] = pa.array(series, from_pandas=True)
+    table = pa.table(arrays)
+    table = table.replace_schema_metadata({
+        _SIDECAR_META_KEY: json.dumps({"json_columns": json_columns, "index": df.index.tolist()}, default=str).encode(),
+    })
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def map_shared_table(path):
+    # Frame backed by the memory-mapped file: numeric and string columns are views on pages shared
+    # through the OS page cache by every process mapping the same file
+    import pyarrow as pa
+
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    stored = json.loads(table.schema.metadata[_SIDECAR_META_KEY])
+    df = table.to_pandas(split_blocks=True)
+    df.index = pd.Index(stored["index"])
+    for col in stored["json_columns"]:
+        df[col] = df[col].map(lambda v: json.loads(v) if isinstance(v, str) else None).astype(object)
+    return df
+
+
+def _header_names(header_row):
+    # Blank headers become "Unnamed: <pos>" and repeated headers get ".1", ".2", ... like pd.read_excel
+    names = []
+    seen = {}
+    for pos, value in enumerate(header_row):
+        name = f"Unnamed: {pos}" if value is None else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def read_workbook_header(path=DATA_FILE, sheet_name=DATA_SHEET):
+    # Column names of the sheet, without reading any data rows
+    signature = workbook_signature(path, sheet_name)
+    sidecar = _sidecar_path(path, sheet_name)
+    if os.path.exists(sidecar):
+        try:
+            schema = _fresh_sidecar_schema(sidecar, signature)
+            if schema is not None:
+                return list(schema.names)
+        except Exception:
+            pass
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    try:
+        header = _header_names(next(workbook[sheet_name].iter_rows(max_row=1, values_only=True), ()))
+    finally:
+        workbook.close()
+    while header and header[-1].startswith("Unnamed: "):
+        header.pop()
+    return header
+
+
+def normalize_dtypes(df):
+    # Compacts the frame in place of the object/float64/int64 columns read_excel produces:
+    # - low-cardinality text columns (cascade keys, YES/NO flags, materials, ...) become `category`,
+    #   so `==` masks and .unique() work on integer codes instead of Python string compares
+    # - integer columns are downcast to the smallest integer type that holds them
+    # - float columns are downcast to float32 only when that is lossless, so displayed values don't change
+    # Values are unchanged; only the storage type differs.
+    df = df.copy()
+    max_unique = max(1, int(len(df) * CATEGORY_MAX_UNIQUE_RATIO))
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_integer_dtype(series):
+            df[col] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series):
+            as_float32 = series.astype("float32")
+            if (as_float32.astype("float64") == series).where(series.notna(), True).all():
+                df[col] = as_float32
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            if series.nunique(dropna=True) <= max_unique:
+                df[col] = series.astype("category")
+    return df
+
+
+def read_workbook(path=DATA_FILE, sheet_name=DATA_SHEET, columns=None, compact_dtypes=True):
+    # Returns the data of pd.read_excel(path, sheet_name=sheet_name, engine="openpyxl"), served from
+    # the Parquet sidecar whenever its recorded mtime/size match the workbook on disk.
+    # With `columns`, only those columns are materialized (missing names are skipped), which is what
+    # the sidebar cascade uses to start from a small key-only frame.
+    # With compact_dtypes the frame comes with normalize_dtypes() applied, as stored in the sidecar;
+    # without, with the dtypes read_excel produces.
+    signature = workbook_signature(path, sheet_name)
+    sidecar = _sidecar_path(path, sheet_name)
+    df = _read_fresh_sidecar(sidecar, signature, columns, compact_dtypes)
+    if df is not None:
+        return df
+
+    # No fresh sidecar: parse the whole sheet once and serve every projection (Year column, cascade
+    # keys, wide frame) from that parse. The projections are columns of the very frame pd.read_excel
+    # returns, so their row labels always address the same rows.
+    with _parse_lock:
+        df = _read_fresh_sidecar(sidecar, signature, columns, compact_dtypes) # Parsed meanwhile by another thread?
+        if df is None:
+            df = _parse_sheet(path, sheet_name, signature, sidecar)
+            if columns is not None:
+                df = df[[col for col in columns if col in df.columns]]
+            if compact_dtypes:
+                df = normalize_dtypes(df)
+    return df
+
+
+def _read_fresh_sidecar(sidecar, signature, columns, compact_dtypes):
+    if os.path.exists(sidecar):
+        try:
+            return _read_sidecar(sidecar, signature, columns=columns, compact_dtypes=compact_dtypes)
+        except Exception:
+            pass # Corrupt/incompatible sidecar or pyarrow unavailable: fall back to parsing the workbook
+    return None
+
+
+def _parse_sheet(path, sheet_name, signature, sidecar):
+    unsaved = _unsaved_parses.get(sidecar)
+    if unsaved is not None and unsaved[0] == signature:
+        return unsaved[1]
+
+    df = pd.read_excel(path, sheet_name=sheet_name, engine="openpyxl")
+    if workbook_signature(path, sheet_name) != signature:
+        return df # Re-saved while parsing: don't label these rows with either version
+
+    try:
+        _write_sidecar(df, sidecar, signature)
+        _unsaved_parses.pop(sidecar, None)
+    except Exception:
+        # Read-only deployments still work; the parse is kept so the other projections don't repeat it
+        _unsaved_parses[sidecar] = (signature, df)
+    return df
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+# Data-quality checks the charts depend on, computed once per data version for every row with
+# vectorized column operations instead of per-cell pd.isna() loops on each rerun:
+#   has_filter_polygon     - x1..y5 all present (chart 1, Internal Cross Section area (Supply Filter))
+#   has_fan_polygon        - x6..y10 all present (chart 2, Internal Cross Section area (Supply Fan))
+#   duct_shape             - chart 3, supply duct connection: "rect" when any of x11..y15 is set
+#                            (present and non-zero), else "circle" when Duct connection Diameter > 0,
+#                            else "none"
+#   has_heater_capacities  - Capacity range1..3 all present (electrical heater chart)
+# Pairs that are not in the sheet are left out, as in schema.coord_col_pairs_*.
+
+ROW_FLAG_COLUMNS = ["has_filter_polygon", "has_fan_polygon", "duct_shape", "has_heater_capacities"]
+DUCT_SHAPES = ["rect", "circle", "none"]
+
+
+def _pair_cols(coord_col_pairs):
+    return [col for pair in coord_col_pairs for col in pair]
+
+
+def _all_present(df, cols):
+    if not cols:
+        return pd.Series(True, index=df.index)
+    return df[cols].notna().all(axis=1)
+
+
+def validate_rows(df, schema):
+    # Flag frame aligned with df.index, so flags.loc[rows] follows the same row labels as df.loc[rows]
+    flags = pd.DataFrame(index=df.index)
+    flags["has_filter_polygon"] = _all_present(df, _pair_cols(schema.coord_col_pairs_1_5))
+    flags["has_fan_polygon"] = _all_present(df, _pair_cols(schema.coord_col_pairs_6_10))
+
+    duct_cols = _pair_cols(schema.coord_col_pairs_11_15)
+    if duct_cols:
+        has_outline = (df[duct_cols].notna() & (df[duct_cols] != 0)).any(axis=1)
+    else:
+        has_outline = pd.Series(False, index=df.index)
+    if schema.duct_connection_diameter_col:
+        has_diameter = pd.to_numeric(df[schema.duct_connection_diameter_col], errors="coerce") > 0
+    else:
+        has_diameter = pd.Series(False, index=df.index)
+    duct_shape = np.select([has_outline, has_diameter], ["rect", "circle"], "none")
+    flags["duct_shape"] = pd.Categorical(duct_shape, categories=DUCT_SHAPES)
+
+    capacity_cols = [schema.capacity_range1_col, schema.capacity_range2_col, schema.capacity_range3_col]
+    if all(capacity_cols):
+        flags["has_heater_capacities"] = _all_present(df, capacity_cols)
+    else:
+        flags["has_heater_capacities"] = False
+    return flags
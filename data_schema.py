@@ -0,0 +1,146 @@
+import logging
+from types import SimpleNamespace
+
+# Column resolution for the "data" sheet, done once per data version instead of probing df.columns
+# with get_column_safe() dozens of times on every rerun.
+#
+# resolve_schema(columns) returns a namespace whose attributes are the physical column names
+# (None when no alias is present), e.g. schema.unit_name_col, schema.coord_col_pairs_1_5 and
+# schema.header_triggers_map. Missing columns are logged once when the schema is built.
+
+logger = logging.getLogger(__name__)
+
+# Logical field -> accepted physical column names, in order of preference
+COLUMN_ALIASES = {
+    "unit_name_col": ["Unit name", "Unit Name"],
+    "region_col": ["Region"],
+    "year_col": ["Year"],
+    "quarter_col": ["Quarter"],
+    "recovery_col": ["Recovery type", "Recovery Type", "Recovery_type"],
+    "size_col": ["Unit size", "Unit Size"],
+    "brand_col": ["Brand name", "Brand"],
+    "logo_col": ["Brand logo", "Brand Logo"],
+    "unit_photo_col": ["Unit photo", "Unit Photo", "Unit Photo Name"],
+    "unit_size_quantity_col": ["Unit size quantity", "Unit Size quantity"],
+    "eurovent_model_box_col": ["Eurovent Model Box"],
+    "eurovent_certificate_col": ["Eurovent Certificate"],
+    "execution_col": ["Execution"],
+    "insulation_material_col": ["Insulation material"],
+    "minimum_airflow_col": ["Minimum airflow [CMH]"],
+    "internal_width_supply_filter_col": ["Internal Width (Supply Filter) [mm]"],
+    "internal_height_supply_filter_col": ["Internal Height (Supply Filter) [mm]", "Internal Height (Supply Filter)", "Internal Height Supply Filter"],
+    "unit_area_col": ["Unit cross section area (Supply Filter) [m2]"],
+    "unit_cross_section_area_supply_fan_col": ["Unit cross section area (Supply Fan) [m2]", "Unit cross section area (Supply Fan)", "Unit cross section area Supply Fan"],
+    "duct_connection_height_col": ["Duct connection Height [mm]", "Duct connection Height", "Duct Connection Height"],
+    "duct_connection_diameter_col": ["Duct connection Diameter [mm]", "Duct connection Diameter", "Duct Connection Diameter"],
+    "duct_connection_width_col": ["Duct connection Width [mm]", "Duct connection Width"],
+    "type_col": ["Type"],
+    "material_col": ["Material"],
+    "wheel_diameter_col": ["Wheel diameter [mm]"],
+    "distance_between_lamels_col": ["Distance between lamels [mm]"],
+    "capacity_range1_col": ["Capacity range1 [kW]", "Capacity range1", "Capacity Range1"],
+    "capacity_range2_col": ["Capacity range2 [kW]", "Capacity range2", "Capacity Range2"],
+    "capacity_range3_col": ["Capacity range3 [kW]", "Capacity range3", "Capacity Range3"],
+    "heating_elements_type_col": ["Heating elements type", "Heating Elements Type", "Heating_elements_type"],
+    "impeller_efficiency_col": ["Impeller efficiency at nominal airflow [%]", "Impeller efficiency at nominal airflow"],
+    "sens_efficiency_nominal_rrg_col": ["Sens. efficiency at nominal balanced airflows_RRG [%]", "Sens. efficiency at nominal balanced airflows [%]"],
+    "sens_efficiency_opt_rrg_col": ["Sens. efficiency at opt balanced airflows (ErP)_RRG [%]", "Sens. efficiency at opt balanced airflows (ErP) [%]"],
+    "sens_efficiency_nominal_pcr_hex_col": ["Sens. efficiency at nominal balanced airflows_PCR/HEX [%]", "Sens. efficiency at nominal balanced airflows [%].1"],
+    "sens_efficiency_opt_pcr_hex_col": ["Sens. efficiency at opt balanced airflows (ErP)_PCR/HEX [%]", "Sens. efficiency at opt balanced airflows (ErP) [%].1"],
+    "metal_sheet_thickness_external_col": ["Metal sheet thickness (External) [mm]", "Metal sheet thickness (External)"],
+    "air_speed_filter_max_airflow_col": ["Air speed on Filter at opt airflow (ErP) [m/s]", "Air speed on Filter at opt airflow (ErP)"],
+    "final_pd_supply_col": ["Final PD_Supply", "Final PD_typ1"],
+    "final_pd_exhaust_col": ["Final PD_Exhaust", "Final PD_typ2"],
+    "water_heater_min_rows_col": ["Water heater_min rows"],
+    "water_cooler_min_rows_col": ["Water cooler_min rows"],
+    "dxh_min_rows_col": ["DXH_min rows"],
+    "filter_type_supply_col": ["Filter type_Supply"],
+    "filter_type_exhaust_col": ["Filter type_Exhaust"],
+    "silencer_casing_col": ["Silencer casing"],
+    "motor_type_col": ["Motor type"],
+    "supply_col": ["Supply"],
+}
+
+# First column of each table section -> section header (logical field names from COLUMN_ALIASES)
+SECTION_TRIGGERS = [
+    ("eurovent_certificate_col", "Certification data"),
+    ("supply_col", "Available configurations"),
+    ("insulation_material_col", "Casing"),
+    ("minimum_airflow_col", "Airflows"),
+    ("internal_width_supply_filter_col", "Overall dimensions"),
+    ("type_col", "Rotary wheel"),
+    ("sens_efficiency_nominal_pcr_hex_col", "PCR/HEX recovery exchanger"),
+    ("motor_type_col", "Fan section data"),
+    ("heating_elements_type_col", "Electrical heater"),
+    ("water_heater_min_rows_col", "Water heater"),
+    ("water_cooler_min_rows_col", "Water cooler"),
+    ("dxh_min_rows_col", "DX/DXH cooler"),
+    ("filter_type_supply_col", "Supply Filter"),
+    ("filter_type_exhaust_col", "Exhaust Filter"),
+    ("silencer_casing_col", "Silencer data"),
+]
+
+# Numeric spec columns shown with a delta against the first unit and a rank among the units in the
+# comparison table (logical field names from COLUMN_ALIASES), with True when higher values are better
+METRIC_FIELDS = [
+    ("sens_efficiency_nominal_rrg_col", True),
+    ("sens_efficiency_opt_rrg_col", True),
+    ("sens_efficiency_nominal_pcr_hex_col", True),
+    ("sens_efficiency_opt_pcr_hex_col", True),
+    ("impeller_efficiency_col", True),
+    ("air_speed_filter_max_airflow_col", False),
+    ("final_pd_supply_col", False),
+    ("final_pd_exhaust_col", False),
+]
+
+
+def _resolve(available, name_options):
+    for name in name_options:
+        if name in available:
+            return name
+    return None
+
+
+def _coord_col_pairs(available, first, last):
+    # Chart polygon points X<i>/Y<i>; only pairs where both columns exist are kept
+    pairs = []
+    for i in range(first, last + 1):
+        x_col_name = _resolve(available, [f"x{i}", f"X{i}", f"X{i}_coord", f"x{i}_coord"])
+        y_col_name = _resolve(available, [f"y{i}", f"Y{i}", f"Y{i}_coord", f"y{i}_coord"])
+        if x_col_name and y_col_name:
+            pairs.append((x_col_name, y_col_name))
+    return pairs
+
+
+def resolve_schema(columns):
+    columns = list(columns)
+    available = set(columns)
+    schema = SimpleNamespace(columns=columns, missing=[])
+
+    for field, name_options in COLUMN_ALIASES.items():
+        resolved = _resolve(available, name_options)
+        setattr(schema, field, resolved)
+        if resolved is None:
+            schema.missing.append(name_options[0])
+
+    schema.coord_col_pairs_1_5 = _coord_col_pairs(available, 1, 5)
+    schema.coord_col_pairs_6_10 = _coord_col_pairs(available, 6, 10)
+    schema.coord_col_pairs_11_15 = _coord_col_pairs(available, 11, 15)
+
+    schema.header_triggers_map = {}
+    for field, header_title in SECTION_TRIGGERS:
+        trigger_col = getattr(schema, field)
+        if trigger_col:
+            schema.header_triggers_map[trigger_col] = header_title
+
+    schema.electrical_heater_chart_trigger_col = schema.heating_elements_type_col # Chart insertion point
+
+    schema.metric_cols = {}
+    for field, higher_is_better in METRIC_FIELDS:
+        metric_col = getattr(schema, field)
+        if metric_col:
+            schema.metric_cols[metric_col] = higher_is_better
+
+    if schema.missing:
+        logger.warning("Data sheet is missing expected columns: %s", ", ".join(schema.missing))
+    return schema
@@ -0,0 +1,394 @@
+import os
+import logging
+import threading
+import weakref
+
+import pandas as pd
+
+from chart_traces import ChartTraces
+from comparison_cache import CHART_CACHE_SIZE, ComparisonCache
+from data_loader import (DATA_FILE, DATA_SHEET, list_partitions, map_shared_table, normalize_dtypes, read_workbook,
+                         read_workbook_header, remove_unused_versions, versioned_cache_path, workbook_files,
+                         workbook_signature, write_shared_table)
+from data_quality import ROW_FLAG_COLUMNS, validate_rows
+from data_schema import resolve_schema
+from display_layout import LayoutPlans
+from selection_index import build_selection_index, lazy_node
+from sqlite_backend import QueryDatabase, QueryFrame, QueryNode, database_path, ingest
+
+# Hot-reload of Data_2025.xlsx without restarting the server or clearing st.cache_data.
+#
+# A DataStore owns the current DataSnapshot: the workbook version (mtime/size) plus every artifact
+# derived from it (wide frame, schema, selection index, ...). Artifacts are produced by builder
+# functions registered by the app and computed lazily on first use. A daemon thread polls the
+# workbook; when it changes, a new snapshot is built completely in the background and then swapped
+# in with a single reference assignment. A script run takes one snapshot at the top and uses it
+# throughout, so a rerun never mixes two data versions and never waits on a cold parse after a reload.
+# Artifacts are built lazily, from the workbooks as they are on disk at that moment, so every builder
+# that reads them checks afterwards that they are still the snapshot's version (DataSnapshot.verify).
+# On a mismatch the build raises DataVersionChanged instead of mixing versions and wakes the watcher,
+# which builds the new version in the background right away instead of on its next poll. current()
+# keeps returning the last good snapshot meanwhile; a run that needs an artifact the stale snapshot
+# can no longer build waits for the new one (wait_for_reload) and reruns on it.
+#
+# The source can also be a workbook with one sheet per year or a directory of workbooks (see
+# data_loader.list_partitions). Artifacts are then kept per year: snapshot.get("df", 2024) only
+# loads the partitions holding 2024, and the Year selectbox is filled without loading any rows of
+# year-named partitions, so startup time and memory don't grow with the history kept on disk.
+#
+# With AHU_DATA_BACKEND=sqlite the same artifacts are answered by indexed queries against an SQLite
+# file shared by all workers (see sqlite_backend) instead of frames held in memory. With
+# AHU_DATA_BACKEND=mmap the wide frame of each year is published once as an Arrow file that every
+# worker process memory-maps, so N workers hold one copy of the table instead of N. Those cache files
+# are named after the data version; a replaced version's files are deleted once no snapshot of the
+# process uses it any more (runs that started before the swap keep the old snapshot until they end).
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL_SECONDS = 5.0
+RELOAD_WAIT_SECONDS = 30.0 # How long wait_for_reload() waits for the watcher to swap in a new version
+DATA_BACKEND = os.environ.get("AHU_DATA_BACKEND", "memory") # "memory", "sqlite" or "mmap"
+
+
+class DataVersionChanged(RuntimeError):
+    # The workbooks were re-saved after the snapshot was taken; rerun with the new snapshot
+    pass
+
+
+def dataset_version(path):
+    # Only stat() calls: a new, removed or re-saved workbook changes the version
+    return tuple(tuple(sorted(workbook_signature(path, None).items())) for path in workbook_files(path))
+
+
+class DataSnapshot:
+    def __init__(self, source, sheet_name, version, builders):
+        self.source = source
+        self.sheet_name = sheet_name
+        self.version = version # Workbook signatures this snapshot was built from; usable as a cache key
+        self.stale = False # Set once a build found the workbooks changed (see verify)
+        self._builders = builders
+        self._artifacts = {}
+        self._lock = threading.RLock() # Re-entrant: builders call get() for the artifacts they depend on
+
+    def get(self, name, year=None):
+        # Builder output for `name` (for one year, or dataset-wide when year is None), computed once per
+        # snapshot; builders may call get() for other artifacts. Artifacts already built stay available
+        # once the snapshot is stale, new ones raise DataVersionChanged without reading the workbooks.
+        key = (name, year)
+        if key in self._artifacts:
+            return self._artifacts[key]
+        with self._lock:
+            if key not in self._artifacts:
+                if self.stale:
+                    raise DataVersionChanged(f"{self.source} has changed since this data version was loaded")
+                self._artifacts[key] = self._builders[name](self, year)
+            return self._artifacts[key]
+
+    def verify(self):
+        # Called by builders after reading the workbooks: raises DataVersionChanged if they are no longer
+        # (or were not, while being read) the version this snapshot stands for
+        try:
+            version = dataset_version(self.source)
+        except OSError:
+            version = None # Being replaced right now
+        if version != self.version:
+            self.stale = True
+            raise DataVersionChanged(f"{self.source} changed while its data was being loaded; rerun to load the new version")
+
+    def build_all(self, warm_from=None):
+        # Dataset-wide artifacts, plus the per-year artifacts already in use in `warm_from` (the snapshot
+        # being replaced) so the years people are looking at don't go cold after a reload
+        for name in self._builders:
+            self.get(name)
+        if warm_from is not None:
+            years = self.get("years")
+            for name, year in list(warm_from._artifacts):
+                if year is not None and year in years:
+                    self.get(name, year)
+
+
+# --- Standard artifacts shared by the comparison apps ---
+
+def _cascade_cols(schema):
+    # Selection index levels below Year, and the optional last-level filters (Type / Material)
+    level_cols = [col for col in (schema.quarter_col, schema.region_col, schema.brand_col,
+                                  schema.unit_name_col, schema.recovery_col, schema.size_col) if col]
+    leaf_cols = [col for col in (schema.type_col, schema.material_col) if col]
+    return level_cols, leaf_cols
+
+
+def build_partitions_artifact(snapshot, year):
+    partitions = list_partitions(snapshot.source, snapshot.sheet_name)
+    snapshot.verify()
+    return partitions
+
+
+def build_schema_artifact(snapshot, year):
+    # All partitions share the layout of the first one
+    partitions = snapshot.get("partitions")
+    if not partitions:
+        return resolve_schema([])
+    header = read_workbook_header(partitions[0].path, sheet_name=partitions[0].sheet_name)
+    snapshot.verify()
+    return resolve_schema(header)
+
+
+def build_years_artifact(snapshot, year):
+    # Year -> partitions holding its rows. Year-named partitions are not opened; of the others only
+    # the Year column is read.
+    year_col = snapshot.get("schema").year_col
+    years = {}
+    for partition in snapshot.get("partitions"):
+        if partition.year is not None:
+            years.setdefault(partition.year, []).append(partition)
+        elif year_col:
+            df_years = read_workbook(partition.path, sheet_name=partition.sheet_name, columns=[year_col], compact_dtypes=False)
+            for value in df_years[year_col].dropna().unique().tolist():
+                years.setdefault(value, []).append(partition)
+    snapshot.verify()
+    return years
+
+
+def _read_year(snapshot, year, columns=None, compact_dtypes=True):
+    # Rows of one year from every partition holding it. A single partition keeps its row labels; several
+    # are renumbered in the same order for the key projection and the wide frame, so labels taken from
+    # the selection index always address the same rows of snapshot.get("df", year).
+    schema = snapshot.get("schema")
+    frames = []
+    for partition in snapshot.get("years").get(year, []):
+        frame = read_workbook(partition.path, sheet_name=partition.sheet_name, columns=columns, compact_dtypes=compact_dtypes)
+        if partition.year is None:
+            frame = frame[frame[schema.year_col] == year]
+        frames.append(frame)
+    snapshot.verify()
+
+    if not frames:
+        return pd.DataFrame(columns=columns if columns is not None else schema.columns)
+    if len(frames) == 1:
+        return frames[0]
+    df = pd.concat(frames, ignore_index=True)
+    if columns is None:
+        df = df.reindex(columns=schema.columns)
+    # Categories differ between partitions, so re-compact the combined frame
+    return normalize_dtypes(df) if compact_dtypes else df
+
+
+def build_selection_index_artifact(snapshot, year):
+    schema = snapshot.get("schema")
+    if year is None:
+        # Year level: options straight from the partition map; each year's subtree is built on first selection
+        return lazy_node(snapshot.get("years"), lambda value: snapshot.get("selection_index", value))
+
+    # Built from a key-only projection so the sidebar doesn't wait for the wide frame
+    level_cols, leaf_cols = _cascade_cols(schema)
+    key_cols = [col for col in [schema.year_col] + level_cols + leaf_cols if col]
+    return build_selection_index(_read_year(snapshot, year, columns=key_cols), level_cols, leaf_cols)
+
+
+def build_table_artifact(snapshot, year):
+    # The wide technical frame of one year. Shared between sessions, so callers must not modify it in place.
+    return _read_year(snapshot, year)
+
+
+def build_row_flags_artifact(snapshot, year):
+    # Per-row chart validity flags (see data_quality), aligned with snapshot.get("df", year)
+    return validate_rows(snapshot.get("df", year), snapshot.get("schema"))
+
+
+def build_layout_plans_artifact(snapshot, year):
+    # Comparison table / CSV layout per recovery-type combination (see display_layout)
+    return LayoutPlans(snapshot.get("schema"))
+
+
+def build_chart_traces_artifact(snapshot, year):
+    # Chart fragments of one year's rows, built per row on first use (see chart_traces). The artifacts
+    # they are built from are fetched here, so a stale snapshot raises now rather than mid-chart.
+    snapshot.get("schema")
+    snapshot.get("df", year)
+    snapshot.get("row_flags", year)
+    return ChartTraces(snapshot, year)
+
+
+def build_comparison_cache_artifact(snapshot, year):
+    # Per-selection comparison results (see comparison_cache), dropped with the snapshot on reload
+    return ComparisonCache()
+
+
+def build_chart_outputs_artifact(snapshot, year):
+    # Recorded chart outputs keyed by each chart's inputs (see comparison_cache), dropped on reload
+    return ComparisonCache(max_entries=CHART_CACHE_SIZE)
+
+
+DEFAULT_BUILDERS = {
+    "partitions": build_partitions_artifact,
+    "schema": build_schema_artifact,
+    "years": build_years_artifact,
+    "selection_index": build_selection_index_artifact,
+    "df": build_table_artifact,
+    "row_flags": build_row_flags_artifact,
+    "layout_plans": build_layout_plans_artifact,
+    "chart_traces": build_chart_traces_artifact,
+    "comparison_cache": build_comparison_cache_artifact,
+    "chart_outputs": build_chart_outputs_artifact,
+}
+
+
+# --- SQLite query backend: same artifact names, answered from the database file ---
+
+def build_database_artifact(snapshot, year):
+    # Ingests the workbooks unless another worker already built the file for this version
+    db_path = database_path(snapshot.source, snapshot.sheet_name, snapshot.version)
+    if not os.path.exists(db_path):
+        schema = snapshot.get("schema")
+        ingest(db_path, schema, build_years_artifact(snapshot, None), _cascade_cols(schema)[0], verify=snapshot.verify)
+    return QueryDatabase(db_path)
+
+
+def build_database_years_artifact(snapshot, year):
+    return snapshot.get("database").years()
+
+
+def build_query_index_artifact(snapshot, year):
+    if year is None:
+        return lazy_node(snapshot.get("years"), lambda value: snapshot.get("selection_index", value))
+    level_cols, leaf_cols = _cascade_cols(snapshot.get("schema"))
+    return QueryNode(snapshot.get("database"), [("year", year)], level_cols, leaf_cols)
+
+
+def build_query_table_artifact(snapshot, year):
+    # Row labels are unique across years, so every year shares one frame stand-in
+    db = snapshot.get("database")
+    return QueryFrame(db.columns, db.fetch)
+
+
+def build_query_row_flags_artifact(snapshot, year):
+    # Flags were computed at ingest; only the selected rows' flags are read
+    db = snapshot.get("database")
+    return QueryFrame(ROW_FLAG_COLUMNS, db.fetch_flags)
+
+
+SQLITE_BUILDERS = {
+    "partitions": build_partitions_artifact,
+    "schema": build_schema_artifact,
+    "database": build_database_artifact,
+    "years": build_database_years_artifact,
+    "selection_index": build_query_index_artifact,
+    "df": build_query_table_artifact,
+    "row_flags": build_query_row_flags_artifact,
+    "layout_plans": build_layout_plans_artifact,
+    "chart_traces": build_chart_traces_artifact,
+    "comparison_cache": build_comparison_cache_artifact,
+    "chart_outputs": build_chart_outputs_artifact,
+}
+
+# --- Memory-mapped backend: the in-memory artifacts, with the wide frames shared between processes ---
+
+def build_shared_table_artifact(snapshot, year):
+    # The first worker to need a year publishes it; every worker then maps the same file. Raw dtypes
+    # are kept, as normalize_dtypes() would turn the mapped columns back into private copies. The file
+    # is named after the snapshot's version and _read_year() raises before writing if the workbook no
+    # longer matches it; files of replaced versions are removed by the DataStore once unused.
+    if year not in snapshot.get("years"):
+        return _read_year(snapshot, year) # Empty frame; nothing to share
+    base_name = os.path.splitext(os.path.basename(os.path.normpath(snapshot.source)))[0]
+    path = versioned_cache_path(snapshot.source, f"{base_name}.{snapshot.sheet_name}.{year}", snapshot.version, ".arrow")
+    if not os.path.exists(path):
+        write_shared_table(_read_year(snapshot, year, compact_dtypes=False), path)
+    return map_shared_table(path)
+
+
+MMAP_BUILDERS = dict(DEFAULT_BUILDERS, df=build_shared_table_artifact)
+
+BACKEND_BUILDERS = {
+    "memory": DEFAULT_BUILDERS,
+    "sqlite": SQLITE_BUILDERS,
+    "mmap": MMAP_BUILDERS,
+}
+
+
+class DataStore:
+    def __init__(self, builders=None, path=DATA_FILE, sheet_name=DATA_SHEET, poll_interval=POLL_INTERVAL_SECONDS):
+        self.path = path # A workbook or a directory of workbooks
+        self.sheet_name = sheet_name
+        self.poll_interval = poll_interval
+        self._builders = dict(builders if builders is not None else BACKEND_BUILDERS[DATA_BACKEND])
+        self._snapshots = weakref.WeakSet() # Every snapshot still referenced: the current one and those of running scripts
+        self._snapshot = self._new_snapshot()
+        self._reload_lock = threading.Lock()
+        self._swapped = threading.Condition() # Notified when a new snapshot is swapped in
+        self._failed_version = None # Version whose last build failed; built again only once the workbooks change
+        self._wake = threading.Event() # Makes the watcher check the workbooks before its next poll
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _new_snapshot(self):
+        snapshot = DataSnapshot(self.path, self.sheet_name, dataset_version(self.path), self._builders)
+        self._snapshots.add(snapshot)
+        return snapshot
+
+    def _remove_unused_versions(self):
+        # Cache files of the versions no snapshot uses any more. Another worker process may still be on
+        # one of them: its SQLite handle and mapped tables keep reading the deleted files, and a year it
+        # has yet to map fails verify() (the workbook changed), which makes it reload.
+        remove_unused_versions(self.path, [snapshot.version for snapshot in list(self._snapshots)])
+
+    def current(self):
+        # The last good snapshot. One that a build found out of date makes the watcher reload right away
+        # rather than on its next poll; the request doesn't wait for that.
+        snapshot = self._snapshot
+        if snapshot.stale:
+            self._wake.set()
+        return snapshot
+
+    def wait_for_reload(self, snapshot, timeout=RELOAD_WAIT_SECONDS):
+        # Waits until a newer snapshot than `snapshot` is current; False if none was swapped in within
+        # `timeout` seconds (e.g. the workbook is still being saved or fails to load)
+        self._wake.set()
+        if self._thread is None:
+            self.reload_if_changed() # No watcher to do it
+        with self._swapped:
+            return self._swapped.wait_for(lambda: self._snapshot is not snapshot, timeout)
+
+    def reload_if_changed(self):
+        # Returns True when a new snapshot was swapped in
+        with self._reload_lock: # The watcher and current() may both get here
+            return self._reload_if_changed()
+
+    def _reload_if_changed(self):
+        try:
+            candidate = self._new_snapshot()
+        except OSError:
+            return False # Workbook is being replaced right now; try again on the next poll
+        if candidate.version in (self._snapshot.version, self._failed_version):
+            return False
+        try:
+            candidate.build_all(warm_from=self._snapshot)
+        except Exception:
+            # Half-saved or broken workbook: keep serving the previous snapshot
+            logger.exception("Reloading %s failed; keeping the previous data version", self.path)
+            self._failed_version = candidate.version
+            return False
+        with self._swapped:
+            previous, self._snapshot = self._snapshot, candidate
+            self._swapped.notify_all()
+        weakref.finalize(previous, self._remove_unused_versions)
+        logger.info("Reloaded %s (sheet %r)", os.path.basename(self.path), self.sheet_name)
+        return True
+
+    def _watch(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            self.reload_if_changed()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name=f"data-store-{self.sheet_name}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
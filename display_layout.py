@@ -0,0 +1,121 @@
+from collections import namedtuple
+
+# Layout of the comparison table and the CSV export: which parameter rows and section headers are
+# shown, in which order, and where the charts go. It depends only on the schema and on the recovery
+# types of the selected units (Rotary wheel rows are hidden when every unit is HEX, PCR/HEX rows when
+# every unit is RRG), so a plan is built once per data version and recovery-type combination and
+# re-used by every rerun; switching between units of the same recovery type does no layout work.
+#
+# A LayoutPlan holds:
+#   excluded_cols     - columns never shown as table rows (selection keys, chart coordinates, ...)
+#   excluded_headers  - section headers hidden for this recovery combination
+#   csv_items         - ("header", title) / ("row", col) entries of the CSV export, in sheet order
+#   display_items     - {"type": "header"/"row"/"chart", ...} entries of the on-page table, in order
+#   sections          - display_items split at the headers: (title, row and chart items) per section,
+#                       starting with the untitled block before the first header
+# Plans are shared between sessions, so callers must not modify them.
+
+LayoutPlan = namedtuple("LayoutPlan", ["excluded_cols", "excluded_headers", "csv_items", "display_items", "sections"])
+
+
+def _excluded_cols(schema, recoveries):
+    # Dropdown keys and chart-only columns
+    excluded = [
+        schema.brand_col, schema.logo_col, schema.unit_photo_col, schema.year_col, schema.quarter_col, schema.region_col,
+        schema.unit_name_col, schema.recovery_col, schema.size_col, schema.type_col, schema.material_col,
+        schema.unit_area_col,
+    ]
+    for x_name, y_name in schema.coord_col_pairs_1_5 + schema.coord_col_pairs_6_10 + schema.coord_col_pairs_11_15:
+        excluded += [x_name, y_name]
+
+    excluded_headers = set()
+    if all(rec == "HEX" for rec in recoveries):
+        excluded += [schema.wheel_diameter_col, schema.distance_between_lamels_col, schema.type_col,
+                     schema.sens_efficiency_nominal_rrg_col, schema.sens_efficiency_opt_rrg_col]
+        excluded_headers.add("Rotary wheel")
+    if all(rec == "RRG" for rec in recoveries):
+        excluded += [schema.material_col, schema.sens_efficiency_nominal_pcr_hex_col, schema.sens_efficiency_opt_pcr_hex_col]
+        excluded_headers.add("PCR/HEX recovery exchanger")
+    return frozenset(col for col in excluded if col is not None), frozenset(excluded_headers)
+
+
+def _csv_items(schema, excluded_cols, excluded_headers):
+    items = []
+    displayed_headers = set()
+    for col in schema.columns:
+        header_title = schema.header_triggers_map.get(col)
+        if header_title and header_title not in displayed_headers and header_title not in excluded_headers:
+            items.append(("header", header_title))
+            displayed_headers.add(header_title)
+        if col not in excluded_cols:
+            items.append(("row", col))
+    return items
+
+
+def _display_items(schema, excluded_cols, excluded_headers):
+    items = []
+    displayed_headers = set()
+    for col_name in schema.columns:
+        # 'Unit size quantity' and the unit area chart go right after 'Execution'
+        if col_name == schema.execution_col:
+            if schema.unit_size_quantity_col not in excluded_cols:
+                items.append({"type": "row", "col": schema.unit_size_quantity_col})
+            items.append({"type": "chart", "name": "unit_area_chart"})
+            continue
+
+        # Headers are placed before the rows of their section
+        header_title = schema.header_triggers_map.get(col_name)
+        if header_title and header_title not in displayed_headers and header_title not in excluded_headers:
+            items.append({"type": "header", "title": header_title})
+            displayed_headers.add(header_title)
+
+        if col_name not in excluded_cols and col_name != schema.unit_size_quantity_col:
+            items.append({"type": "row", "col": col_name})
+
+        # Charts follow their trigger columns
+        if col_name == schema.internal_height_supply_filter_col:
+            items.append({"type": "chart", "name": "chart1"})
+        elif col_name == schema.unit_cross_section_area_supply_fan_col:
+            items.append({"type": "chart", "name": "chart2"})
+        elif col_name == schema.duct_connection_height_col:
+            items.append({"type": "chart", "name": "chart3"})
+        elif col_name == schema.electrical_heater_chart_trigger_col:
+            # The capacity range lines come right before the electrical heater chart
+            for capacity_col in (schema.capacity_range1_col, schema.capacity_range2_col, schema.capacity_range3_col):
+                if capacity_col:
+                    items.append({"type": "row", "col": capacity_col})
+            items.append({"type": "chart", "name": "electrical_heater_chart"})
+    return items
+
+
+def _sections(display_items):
+    sections = [(None, [])]
+    for item in display_items:
+        if item["type"] == "header":
+            sections.append((item["title"], []))
+        else:
+            sections[-1][1].append(item)
+    return sections
+
+
+def build_layout_plan(schema, recoveries):
+    excluded_cols, excluded_headers = _excluded_cols(schema, recoveries)
+    display_items = _display_items(schema, excluded_cols, excluded_headers)
+    return LayoutPlan(excluded_cols, excluded_headers,
+                      _csv_items(schema, excluded_cols, excluded_headers),
+                      display_items, _sections(display_items))
+
+
+class LayoutPlans:
+    # Recovery-type combination (one entry per unit, in unit order) -> LayoutPlan, built on first use
+    def __init__(self, schema):
+        self._schema = schema
+        self._plans = {}
+
+    def get(self, recoveries):
+        key = tuple(recoveries)
+        plan = self._plans.get(key)
+        if plan is None:
+            # Two sessions may build the same plan at once; both results are identical
+            plan = self._plans.setdefault(key, build_layout_plan(self._schema, key))
+        return plan
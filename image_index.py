@@ -0,0 +1,57 @@
+import os
+import struct
+
+from PIL import Image
+
+# Pixel dimensions of every image under images/, read once from the file headers when the index is
+# created. The logo and photo sections only need the sizes of a pair to pick their common display
+# height, so they look them up here instead of opening both images with PIL; an image is only read
+# in full once it is actually drawn. A PNG's size is taken from its IHDR chunk, the first 24 bytes of the file;
+# other formats fall back to PIL's header-only Image.open(). Entries are keyed by (mtime, size), so
+# an image replaced or added after startup is re-read on its next lookup.
+
+IMAGES_DIR = "images" # Path relative to the app directory, as in the original Image.open() calls
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def image_files(images_dir=IMAGES_DIR):
+    # Every file under images_dir, named relative to it as in the data
+    names = set()
+    for dir_path, _, file_names in os.walk(images_dir):
+        for file_name in file_names:
+            names.add(os.path.relpath(os.path.join(dir_path, file_name), images_dir).replace(os.sep, "/"))
+    return names
+
+
+def read_size(path):
+    # (width, height) of the image at path, without decoding it; raises as Image.open() does
+    with open(path, "rb") as f:
+        header = f.read(24)
+    if header[:8] == PNG_SIGNATURE and header[12:16] == b"IHDR":
+        return struct.unpack(">II", header[16:24])
+    with Image.open(path) as image:
+        return image.size
+
+
+class ImageIndex:
+    def __init__(self, images_dir=IMAGES_DIR):
+        self.images_dir = images_dir
+        self._sizes = {} # Image name -> ((mtime, size), (width, height))
+        for name in image_files(images_dir):
+            try:
+                self.size(name)
+            except Exception:
+                pass # Not an image; size() raises the error if the data ever names it
+
+    def size(self, name):
+        # (width, height) of images/<name>; raises FileNotFoundError / PIL errors as Image.open() does
+        path = os.path.join(self.images_dir, name)
+        stat = os.stat(path)
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        cached = self._sizes.get(name)
+        if cached is not None and cached[0] == stat_key:
+            return cached[1]
+        size = read_size(path)
+        self._sizes[name] = (stat_key, size)
+        return size
+
@@ -0,0 +1,28 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from image_index import IMAGES_DIR
+from thumbnail_cache import encode_image
+
+# Logos and photos of an N-unit comparison decoded, resized and encoded on a thread pool. The image
+# strips used to open and resize up to 10 logos and then 10 photos one after the other on the script
+# thread, and st.image() encoded each result there as well; PIL releases the GIL while decoding,
+# resampling and encoding, so the pool prepares a whole strip in about the time of its largest image.
+# The bytes are the ones st.image() would have made from the resized image, so it sends them as they are.
+
+IMAGE_WORKERS = 8 # Threads shared by every session of the server process
+
+_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image-prep")
+
+
+def _prepare(path, width):
+    with Image.open(path) as image:
+        return encode_image(image.resize((width, int(width * image.height / image.width))))
+
+
+def prepare_images(names, width, images_dir=IMAGES_DIR):
+    # One future per name, in column order, for images/<name> resized to `width` pixels (height in
+    # proportion); None where there is no name. result() raises what Image.open() / resize() raised.
+    return [None if not name else _executor.submit(_prepare, os.path.join(images_dir, name), width) for name in names]
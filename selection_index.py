@@ -0,0 +1,93 @@
+from collections.abc import Mapping
+
+import pandas as pd
+
+# Prebuilt lookup structure for the sidebar cascade (Year -> Quarter -> Region -> Brand -> Unit name ->
+# Recovery type -> Unit size, then Type or Material depending on the recovery type).
+#
+# Each node is a dict:
+#   "options"  - sorted selectbox options for the next level (same as sorted(df[col].dropna().unique()))
+#   "children" - {option value: child node}
+#   "rows"     - index labels of all rows under this node
+#   "leaf"     - only on the last level: {column: {"options": [...], "rows": {value: index labels}}}
+# so every selectbox reads its options from a node and descends one level in O(1) instead of
+# masking the DataFrame again at every level on every rerun.
+
+EMPTY_NODE = {"options": [], "children": {}, "rows": pd.Index([]), "leaf": {}}
+
+
+def sorted_options(values):
+    try:
+        return sorted(values)
+    except TypeError:
+        return sorted(values, key=str) # Mixed str/int placeholders (e.g. Type = 0 on non-RRG rows)
+
+
+def _build_node(df, level_cols, leaf_cols):
+    node = {"options": [], "children": {}, "rows": df.index, "leaf": {}}
+
+    if not level_cols:
+        for col in leaf_cols:
+            groups = df.groupby(col, sort=False, dropna=True, observed=True).groups
+            node["leaf"][col] = {
+                "options": sorted_options(groups.keys()),
+                "rows": {value: rows for value, rows in groups.items()},
+            }
+        return node
+
+    col, rest = level_cols[0], level_cols[1:]
+    groups = df.groupby(col, sort=False, dropna=True, observed=True).groups
+    node["options"] = sorted_options(groups.keys())
+    for value, rows in groups.items():
+        node["children"][value] = _build_node(df.loc[rows], rest, leaf_cols)
+    return node
+
+
+def build_selection_index(df, level_cols, leaf_cols=()):
+    # level_cols are the always-shown cascade columns in order; leaf_cols are the optional last-level
+    # filters (Type / Material). Columns that could not be resolved (None) are skipped.
+    level_cols = [col for col in level_cols if col]
+    leaf_cols = [col for col in leaf_cols if col]
+    return _build_node(df, level_cols, leaf_cols)
+
+
+class LazyChildren(Mapping):
+    # Children known by value up front but only built when first looked up
+    def __init__(self, values, build_child):
+        self._values = list(values)
+        self._build_child = build_child
+
+    def __getitem__(self, value):
+        if value not in self._values:
+            raise KeyError(value)
+        return self._build_child(value)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+
+def lazy_node(values, build_child):
+    # Node whose options are known without loading anything and whose child for a value is built by
+    # build_child(value) on first selection (the caller memoizes it), e.g. one data partition per Year
+    return {"options": sorted_options(values), "children": LazyChildren(values, build_child), "rows": pd.Index([]), "leaf": {}}
+
+
+def child_node(node, value):
+    # Child for the selected value; an empty node when nothing is selected (empty options list)
+    return node["children"].get(value, EMPTY_NODE)
+
+
+def leaf_options(node, col):
+    leaf = node["leaf"].get(col)
+    return leaf["options"] if leaf else []
+
+
+def leaf_rows(node, col, value):
+    # Row labels under a last-level node further restricted to col == value
+    leaf = node["leaf"].get(col)
+    if not leaf:
+        return pd.Index([])
+    return leaf["rows"].get(value, pd.Index([]))
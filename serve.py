@@ -0,0 +1,16 @@
+import os
+
+import streamlit as st
+
+import static_images
+
+# Runs one of the comparison apps with images/ served as static files (see static_images):
+#
+#     streamlit run serve.py                          # app_2307_4.py
+#     AHU_APP=app_2008_1.py streamlit run serve.py
+#
+# Started the usual way (streamlit run app_2307_4.py), the apps send the image pixels themselves.
+
+APP_SCRIPT = os.environ.get("AHU_APP", "app_2307_4.py")
+
+app = st.App(APP_SCRIPT, middleware=static_images.middleware())
@@ -0,0 +1,236 @@
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+from data_loader import read_workbook, versioned_cache_path
+from data_quality import ROW_FLAG_COLUMNS, validate_rows
+from selection_index import EMPTY_NODE, LazyChildren, sorted_options
+
+# Query backend for large deployments: the dataset is ingested once into an SQLite file with an index
+# on the cascade key columns, and the sidebar options and the selected rows come from indexed queries
+# instead of an in-memory frame per process. Several Streamlit workers share the same file.
+#
+# Layout of the database file:
+#   data(row_id, year, c0, c1, ...) - one row per unit; c<i> is the i-th sheet column, `year` the
+#                                     partition year (see data_store), row_id the row label
+#   columns(position, name, dtype)  - sheet column names and the pandas dtype to restore on read
+#   row_flags(row_id, ...)          - data_quality.validate_rows() flags, computed at ingest
+# Columns are stored without a declared type, so the str/int mix of "Type"/"Material" survives.
+#
+# The file name carries a digest of the workbook versions it was built from, so a re-saved workbook
+# gets a new file. The previous file is deleted once no snapshot of the process uses it (see
+# data_store), possibly while another worker is still on that version; QueryDatabase therefore opens
+# the file once and shares that handle, which keeps reading the deleted file.
+
+SQLITE_PARAMS_PER_QUERY = 500 # Row ids per "IN (...)" query, well below SQLite's bound parameter limit
+
+
+def database_path(source, sheet_name, version):
+    base_name = os.path.splitext(os.path.basename(os.path.normpath(source)))[0]
+    return versioned_cache_path(source, f"{base_name}.{sheet_name}", version, ".sqlite")
+
+
+def _sql_value(value):
+    # sqlite3 binds only plain Python scalars; missing values become NULL
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def ingest(db_path, schema, years, level_cols, verify=None):
+    # Writes every row of `years` (year -> partitions, as built by data_store) to a new database file.
+    # verify() is called once the workbooks are read and may raise to keep rows of another workbook
+    # version from being published under db_path.
+    columns = list(schema.columns)
+    frames = {}
+    records = []
+    flag_records = []
+    dtypes = {}
+    for year in sorted_options(years):
+        for partition in years[year]:
+            if partition not in frames:
+                frames[partition] = read_workbook(partition.path, sheet_name=partition.sheet_name, compact_dtypes=False)
+            frame = frames[partition]
+            if partition.year is None:
+                frame = frame[frame[schema.year_col] == year]
+            frame = frame.reindex(columns=columns)
+            for col in columns:
+                dtypes.setdefault(col, str(frame[col].dtype))
+            flags = validate_rows(frame, schema)
+            for row, flag_row in zip(zip(*(frame[col].tolist() for col in columns)),
+                                     zip(*(flags[col].tolist() for col in ROW_FLAG_COLUMNS))):
+                row_id = len(records)
+                records.append([row_id, _sql_value(year)] + [_sql_value(v) for v in row])
+                flag_records.append([row_id] + [_sql_value(v) for v in flag_row])
+    if verify is not None:
+        verify()
+
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    tmp_path = f"{db_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    con = sqlite3.connect(tmp_path)
+    try:
+        value_cols = ", ".join(f"c{pos}" for pos in range(len(columns)))
+        con.execute(f"CREATE TABLE data (row_id INTEGER PRIMARY KEY, year, {value_cols})")
+        con.execute("CREATE TABLE columns (position INTEGER PRIMARY KEY, name TEXT, dtype TEXT)")
+        con.executemany("INSERT INTO columns VALUES (?, ?, ?)",
+                        [(pos, col, dtypes.get(col, "object")) for pos, col in enumerate(columns)])
+        placeholders = ", ".join("?" * (len(columns) + 2))
+        con.executemany(f"INSERT INTO data (row_id, year, {value_cols}) VALUES ({placeholders})", records)
+        con.execute(f"CREATE TABLE row_flags (row_id INTEGER PRIMARY KEY, {', '.join(ROW_FLAG_COLUMNS)})")
+        con.executemany(f"INSERT INTO row_flags VALUES ({', '.join('?' * (len(ROW_FLAG_COLUMNS) + 1))})", flag_records)
+        # One composite index serves every level of the cascade (each query filters on a prefix of it)
+        key_cols = ["year"] + [f"c{columns.index(col)}" for col in level_cols if col in columns]
+        con.execute(f"CREATE INDEX cascade_keys ON data ({', '.join(key_cols)})")
+        con.commit()
+    finally:
+        con.close()
+    os.replace(tmp_path, db_path) # Other workers only ever see a complete file
+
+
+class QueryDatabase:
+    # Read-only access to one database file through one connection, opened here and shared by the
+    # threads Streamlit reruns scripts on (queries are serialized; each is a short indexed lookup)
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.columns = []
+        self.dtypes = {}
+        for pos, name, dtype in self._execute("SELECT position, name, dtype FROM columns ORDER BY position"):
+            self.columns.append(name)
+            self.dtypes[name] = dtype
+        self._sql_names = {name: f"c{pos}" for pos, name in enumerate(self.columns)}
+
+    def _execute(self, query, params=()):
+        with self._lock:
+            return self._con.execute(query, params).fetchall()
+
+    def sql_name(self, col):
+        return self._sql_names[col]
+
+    def _where(self, filters):
+        if not filters:
+            return "", []
+        return " WHERE " + " AND ".join(f"{sql_col} = ?" for sql_col, _ in filters), [_sql_value(v) for _, v in filters]
+
+    def years(self):
+        return [year for (year,) in self._execute("SELECT DISTINCT year FROM data")]
+
+    def distinct(self, sql_col, filters):
+        # Selectbox options of `sql_col` under the given (sql column, value) filters
+        where, params = self._where(filters)
+        query = f"SELECT DISTINCT {sql_col} FROM data{where}{' AND' if where else ' WHERE'} {sql_col} IS NOT NULL"
+        return sorted_options([value for (value,) in self._execute(query, params)])
+
+    def row_ids(self, filters):
+        where, params = self._where(filters)
+        return pd.Index([row_id for (row_id,) in self._execute(f"SELECT row_id FROM data{where} ORDER BY row_id", params)])
+
+    def _fetch_rows(self, table, sql_cols, columns, row_ids):
+        # Rows of `table` for `row_ids`, in that order, as a frame indexed by row id
+        row_ids = [int(row_id) for row_id in row_ids]
+        records = []
+        for start in range(0, len(row_ids), SQLITE_PARAMS_PER_QUERY):
+            chunk = row_ids[start:start + SQLITE_PARAMS_PER_QUERY]
+            query = f"SELECT row_id, {', '.join(sql_cols)} FROM {table} WHERE row_id IN ({', '.join('?' * len(chunk))})"
+            records.extend(self._execute(query, chunk))
+
+        by_id = {record[0]: record[1:] for record in records}
+        found = [row_id for row_id in row_ids if row_id in by_id]
+        return pd.DataFrame([by_id[row_id] for row_id in found], columns=columns, index=pd.Index(found))
+
+    def fetch(self, row_ids):
+        # The wide rows for `row_ids`, in that order, with the dtypes pd.read_excel gave the sheet
+        df = self._fetch_rows("data", [self._sql_names[col] for col in self.columns], self.columns, row_ids)
+        for col in self.columns:
+            dtype = self.dtypes[col]
+            if dtype == "object":
+                df[col] = df[col].astype(object).where(df[col].notna(), np.nan)
+            else:
+                try:
+                    df[col] = df[col].astype(dtype)
+                except (TypeError, ValueError):
+                    pass
+        return df
+
+    def fetch_flags(self, row_ids):
+        flags = self._fetch_rows("row_flags", ROW_FLAG_COLUMNS, ROW_FLAG_COLUMNS, row_ids)
+        for col in ROW_FLAG_COLUMNS:
+            if col.startswith("has_"):
+                flags[col] = flags[col].astype(bool)
+        return flags
+
+
+class QueryNode(Mapping):
+    # Selection index node (see selection_index) answered by queries: same keys as the prebuilt nodes,
+    # each computed on first access. `filters` are (sql column, value) pairs of the levels above.
+    def __init__(self, db, filters, level_cols, leaf_cols):
+        self._db = db
+        self._filters = tuple(filters)
+        self._level_cols = list(level_cols)
+        self._leaf_cols = list(leaf_cols)
+        self._values = {}
+
+    def __getitem__(self, key):
+        if key not in self._values:
+            if key == "options":
+                self._values[key] = self._db.distinct(self._db.sql_name(self._level_cols[0]), self._filters) if self._level_cols else []
+            elif key == "children":
+                self._values[key] = self._children()
+            elif key == "rows":
+                self._values[key] = self._db.row_ids(self._filters)
+            elif key == "leaf":
+                self._values[key] = self._leaf()
+            else:
+                raise KeyError(key)
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(EMPTY_NODE)
+
+    def __len__(self):
+        return len(EMPTY_NODE)
+
+    def _children(self):
+        if not self._level_cols:
+            return {}
+        sql_col = self._db.sql_name(self._level_cols[0])
+        return LazyChildren(self["options"], lambda value: QueryNode(
+            self._db, self._filters + ((sql_col, value),), self._level_cols[1:], self._leaf_cols))
+
+    def _leaf(self):
+        if self._level_cols:
+            return {}
+        leaf = {}
+        for col in self._leaf_cols:
+            sql_col = self._db.sql_name(col)
+            options = self._db.distinct(sql_col, self._filters)
+            leaf[col] = {
+                "options": options,
+                "rows": LazyChildren(options, lambda value, sql_col=sql_col: self._db.row_ids(self._filters + ((sql_col, value),))),
+            }
+        return leaf
+
+
+class _RowFetcher:
+    def __init__(self, fetch):
+        self._fetch = fetch
+
+    def __getitem__(self, row_ids):
+        return self._fetch(row_ids)
+
+
+class QueryFrame:
+    # Stands in for a frame of one year (wide rows or row flags): .loc[rows] reads just those rows
+    # from the database
+    def __init__(self, columns, fetch):
+        self.columns = pd.Index(columns)
+        self.loc = _RowFetcher(fetch)
@@ -0,0 +1,89 @@
+import os
+from urllib.parse import quote
+
+import streamlit as st
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+from image_index import IMAGES_DIR
+
+# Logos and unit photos served by URL as static files, instead of st.image() encoding the pixels and
+# pushing them through the websocket on every rerun. serve.py mounts StaticImages in front of the
+# Streamlit server; the apps then hand st.image() an image_url() and the browser fetches the file
+# from the server once and keeps it in its cache.
+#
+# The URLs live under /app/static/, the only relative URLs st.image() passes to the browser as they
+# are; the middleware answers them before Streamlit's own static route (which serves ./static and is
+# not enabled here). Each URL carries the file's version (mtime and size), which is also its ETag, so
+# a versioned request is cached for a year and a replaced image simply gets a new URL. A request
+# without the current version is answered with no-cache and revalidated by ETag (304).
+
+URL_PREFIX = "/app/static/images/" # Under Streamlit's static URL space, see above
+MAX_AGE = 365 * 24 * 60 * 60 # Seconds a versioned image URL may be cached
+
+_enabled = False # Set by middleware() when serve.py mounts StaticImages in this process
+
+
+def static_serving():
+    # True when images/ is served by StaticImages, i.e. the app runs through serve.py
+    return _enabled
+
+
+def _version(stat):
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def image_url(name, images_dir=IMAGES_DIR):
+    # Versioned URL of images/<name>; raises FileNotFoundError as Image.open() does
+    stat = os.stat(os.path.join(images_dir, name))
+    return f"{URL_PREFIX}{quote(name)}?v={_version(stat)}"
+
+
+def image_source(name, images_dir=IMAGES_DIR):
+    # What to hand st.image() for images/<name>: its URL when images are served statically, else the path
+    if _enabled:
+        return image_url(name, images_dir)
+    return os.path.join(images_dir, name)
+
+
+class StaticImages:
+    # ASGI middleware answering GET/HEAD requests for URL_PREFIX from images_dir
+    def __init__(self, app, images_dir=IMAGES_DIR):
+        self.app = app
+        self.images_root = os.path.realpath(images_dir)
+        base = st.get_option("server.baseUrlPath").strip("/")
+        self.prefix = f"/{base}{URL_PREFIX}" if base else URL_PREFIX
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+        response = self._response(Request(scope))
+        await response(scope, receive, send)
+
+    def _response(self, request):
+        if request.method not in ("GET", "HEAD"):
+            return Response(status_code=405, headers={"Allow": "GET, HEAD"})
+        # Only files inside images_dir, as Streamlit's path security does for ./static
+        path = os.path.realpath(os.path.join(self.images_root, request.scope["path"][len(self.prefix):]))
+        if not path.startswith(self.images_root + os.sep) or not os.path.isfile(path):
+            return Response(status_code=404)
+
+        stat = os.stat(path)
+        version = _version(stat)
+        headers = {"ETag": f'"{version}"', "X-Content-Type-Options": "nosniff"}
+        if request.query_params.get("v") == version:
+            headers["Cache-Control"] = f"public, max-age={MAX_AGE}, immutable"
+        else:
+            headers["Cache-Control"] = "no-cache"
+        if headers["ETag"] in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        return FileResponse(path, headers=headers, stat_result=stat)
+
+
+def middleware():
+    # The middleware list for st.App(); marks static serving as enabled for the apps of this process
+    global _enabled
+    _enabled = True
+    return [Middleware(StaticImages)]
@@ -0,0 +1,129 @@
+import os
+import io
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from data_loader import CACHE_DIR
+from image_index import IMAGES_DIR, ImageIndex
+
+# Resized brand logos and unit photos, ready to hand to st.image(). Every rerun used to decode the
+# full-size PNG (e.g. the 222 KB SVS.png) and resample it on the request thread; a thumbnail is now
+# encoded once per (file content hash, target height) and kept both in a bounded in-memory LRU and
+# on disk in the cache directory, so restarts and other worker processes re-use it as well.
+#
+# Thumbnails are encoded as st.image() encodes a PIL image (PNG when the image may have an alpha
+# channel, JPEG otherwise), so Streamlit sends the bytes as they are; bytes in any other format
+# (e.g. WebP) would be decoded and re-encoded by Streamlit on every call.
+#
+# build_assets.py fills the disk cache ahead of time and writes a manifest with each image's digest
+# and dimensions. For an image that is unchanged since the build (same mtime and size), source() takes
+# them from the manifest and thumbnail() finds its file on disk, so no image is opened or decoded.
+# The manifest is read again whenever its mtime or size changes, so a build run while the apps are
+# serving is picked up without a restart.
+
+THUMBNAIL_DIR = "thumbnails" # Inside data_loader.CACHE_DIR, next to the images directory
+THUMBNAIL_CACHE_SIZE = 64 # Thumbnails kept in memory per process; the least recently used is dropped
+MANIFEST_FILE = "manifest.json" # Written by build_assets.py into the thumbnail directory
+
+
+def encode_image(image):
+    # Same format choice and encoder settings as st.image() for a PIL image
+    image_format = "PNG" if image.mode in ("RGBA", "LA", "P") else "JPEG"
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=100)
+    return buffer.getvalue()
+
+
+def read_manifest(cache_dir):
+    # {image name: {"digest", "width", "height", "mtime_ns", "size"}}; empty when build_assets.py
+    # hasn't been run
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_FILE)) as f:
+            return json.load(f)["images"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+class ThumbnailCache:
+    def __init__(self, images_dir=IMAGES_DIR, max_entries=THUMBNAIL_CACHE_SIZE):
+        self.images_dir = images_dir
+        self.cache_dir = os.path.join(os.path.dirname(os.path.abspath(images_dir)), CACHE_DIR, THUMBNAIL_DIR)
+        self.max_entries = max_entries
+        self.index = ImageIndex(images_dir)
+        self._thumbnails = OrderedDict()
+        self._sources = {} # File path -> ((mtime, size), (content digest, width, height))
+        self._manifest = (None, {}) # ((mtime, size) of the manifest file, its entries)
+        self._lock = threading.Lock()
+
+    def _manifest_entries(self):
+        # Entries of the manifest, re-read when the file changes
+        try:
+            stat = os.stat(os.path.join(self.cache_dir, MANIFEST_FILE))
+            stat_key = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stat_key = None
+        manifest = self._manifest
+        if stat_key != manifest[0]:
+            manifest = (stat_key, read_manifest(self.cache_dir) if stat_key is not None else {})
+            self._manifest = manifest
+        return manifest[1]
+
+    def size(self, name):
+        # (width, height) of images/<name>, from the image index; for sizing a pair before drawing it
+        return self.index.size(name)
+
+    def source(self, name):
+        # (content digest, width, height) of images/<name>, re-read only when the file changes; raises
+        # FileNotFoundError / PIL errors as Image.open() does
+        path = os.path.join(self.images_dir, name)
+        stat = os.stat(path)
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        cached = self._sources.get(path)
+        if cached is not None and cached[0] == stat_key:
+            return cached[1]
+        entry = self._manifest_entries().get(name)
+        if entry is not None and (entry["mtime_ns"], entry["size"]) == stat_key:
+            return entry["digest"], entry["width"], entry["height"]
+        width, height = self.index.size(name)
+        with open(path, "rb") as f:
+            info = (hashlib.sha1(f.read()).hexdigest(), width, height)
+        self._sources[path] = (stat_key, info)
+        return info
+
+    def thumbnail(self, name, height):
+        # Encoded bytes of images/<name> resized to `height` pixels, width in proportion
+        digest, source_width, source_height = self.source(name)
+        key = (digest, height)
+        with self._lock:
+            data = self._thumbnails.get(key)
+            if data is not None:
+                self._thumbnails.move_to_end(key)
+                return data
+
+        disk_path = os.path.join(self.cache_dir, f"{digest}.{height}.thumb")
+        try:
+            with open(disk_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            with Image.open(os.path.join(self.images_dir, name)) as image:
+                data = encode_image(image.resize((int(source_width * (height / source_height)), height)))
+            # Write to a temp file and rename so other workers never read a half-written thumbnail
+            tmp_path = f"{disk_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, disk_path)
+            except OSError:
+                pass # Read-only deployment: the thumbnail is only kept in memory below
+
+        with self._lock:
+            self._thumbnails[key] = data
+            self._thumbnails.move_to_end(key)
+            while len(self._thumbnails) > self.max_entries:
+                self._thumbnails.popitem(last=False)
+        return data